@@ -5,29 +5,73 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
 
 from src.auth import auth_bp
+from src import answer_writer, database, metrics, passwords, profiling
+from src.commands import quiz_cli
 from src.routes import quiz_bp
 from src.shared import db
 from src.models import User
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
+CORS(app, origins=["http://localhost:3000"], supports_credentials=True, expose_headers=[database.READ_AFTER_HEADER])
 
 app.config.update(
-    SQLALCHEMY_DATABASE_URI='postgresql://quizuser:quizpass@db:5432/quizdb',
+    SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', 'postgresql://quizuser:quizpass@db:5432/quizdb'),
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    DATABASE_REPLICA_URL=os.environ.get('DATABASE_REPLICA_URL'),
+    WEB_CONCURRENCY=int(os.environ.get('WEB_CONCURRENCY', 1)),
+    GUNICORN_THREADS=int(os.environ.get('GUNICORN_THREADS', 4)),
+    DB_POOL_SIZE=int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None,
+    DB_MAX_OVERFLOW=int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+    DB_MAX_CONNECTIONS=int(os.environ['DB_MAX_CONNECTIONS']) if os.environ.get('DB_MAX_CONNECTIONS') else None,
+    DB_POOL_TIMEOUT=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    DB_POOL_RECYCLE=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    DB_POOL_PRE_PING=os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    DB_STATEMENT_TIMEOUT_MS=int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0)),
+    DB_PGBOUNCER=os.environ.get('DB_PGBOUNCER', '').lower() in ('1', 'true', 'yes'),
     JWT_SECRET_KEY='your-secret-key',
-    JWT_ACCESS_TOKEN_EXPIRES=timedelta(hours=24)
+    JWT_ACCESS_TOKEN_EXPIRES=timedelta(hours=24),
+    QUESTION_BANK_VERSION_TTL=float(os.environ.get('QUESTION_BANK_VERSION_TTL', 0)),
+    REQUIRE_ATTEMPT_TOKEN=os.environ.get('REQUIRE_ATTEMPT_TOKEN', '').lower() in ('1', 'true', 'yes'),
+    SLOW_REQUEST_MS=float(os.environ.get('SLOW_REQUEST_MS', 500)),
+    METRICS_TOKEN=os.environ.get('METRICS_TOKEN'),
+    PROFILE_SAMPLE_RATE=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    PROFILE_TOKEN=os.environ.get('PROFILE_TOKEN'),
+    PROFILE_DIR=os.environ.get('PROFILE_DIR', 'profiles'),
+    PROFILE_KEEP=int(os.environ.get('PROFILE_KEEP', 200)),
+    PASSWORD_HASH_METHOD=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    PASSWORD_HASH_WORKERS=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    PASSWORD_HASH_QUEUE=int(os.environ.get('PASSWORD_HASH_QUEUE', 8)),
+    PASSWORD_HASH_TIMEOUT=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10)),
+    PASSWORD_HASH_RETRY_AFTER=int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1)),
+    ASYNC_DATABASE_URL=os.environ.get('ASYNC_DATABASE_URL'),
+    ASYNC_POOL_SIZE=int(os.environ.get('ASYNC_POOL_SIZE', 20)),
+    ASYNC_POOL_OVERFLOW=int(os.environ.get('ASYNC_POOL_OVERFLOW', 0)),
+    ASYNC_WSGI_THREADS=int(os.environ.get('ASYNC_WSGI_THREADS', 10)),
+    ANSWER_WRITE_BEHIND=os.environ.get('ANSWER_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'),
+    ANSWER_QUEUE_ROWS=int(os.environ.get('ANSWER_QUEUE_ROWS', 50000)),
+    ANSWER_FLUSH_ROWS=int(os.environ.get('ANSWER_FLUSH_ROWS', 5000)),
+    ANSWER_FLUSH_INTERVAL=float(os.environ.get('ANSWER_FLUSH_INTERVAL', 0.2)),
+    ANSWER_SHUTDOWN_TIMEOUT=float(os.environ.get('ANSWER_SHUTDOWN_TIMEOUT', 30)),
+    PARTITION_MONTHS_AHEAD=int(os.environ.get('PARTITION_MONTHS_AHEAD', 3)),
+    ARCHIVE_AFTER_MONTHS=int(os.environ['ARCHIVE_AFTER_MONTHS']) if os.environ.get('ARCHIVE_AFTER_MONTHS') else None,
+    ARCHIVE_DIR=os.environ.get('ARCHIVE_DIR', 'archive'),
+    LEADERBOARD_REFRESH_SECONDS=float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 30)),
+    ADMIN_USER_IDS={uid.strip() for uid in os.environ.get('ADMIN_USER_IDS', '').split(',') if uid.strip()}
 )
 
 jwt = JWTManager(app)
 migrate = Migrate(app, db)
-db.init_app(app)
+database.init_app(app)
+metrics.init_app(app)
+profiling.init_app(app)
+passwords.init_app(app)
+answer_writer.init_app(app)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(quiz_bp)
+app.cli.add_command(quiz_cli)
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -53,7 +97,7 @@ def register():
     if User.query.filter_by(username=username).first():
         return jsonify({'message': 'Already registered'}), 400
 
-    hashed_pw = generate_password_hash(password)
+    hashed_pw = passwords.hash_password(password)
     new_user = User(username=username, password_hash=hashed_pw)
     db.session.add(new_user)
     db.session.commit()
@@ -69,8 +113,10 @@ def login():
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({"message": "Username is incorrect"}), 401
-    if not check_password_hash(user.password_hash, password):
+    if not passwords.verify_password(user.password_hash, password):
         return jsonify({"message": "Password is incorrect"}), 401
+    if passwords.try_rehash(user, password):
+        db.session.commit()
 
     access_token = create_access_token(
         identity=str(user.id),
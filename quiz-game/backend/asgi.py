@@ -0,0 +1,10 @@
+"""ASGI entry point: `uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4`.
+
+/api/questions, /api/user-progress and /api/quiz-history are served on
+the event loop with asyncpg; every other route runs through the Flask
+app in a thread pool. See src/async_api.py.
+"""
+from app import app as flask_app
+from src.async_api import AsyncQuizApp
+
+app = AsyncQuizApp(flask_app)
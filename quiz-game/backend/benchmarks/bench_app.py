@@ -0,0 +1,16 @@
+"""WSGI entry point for benchmark runs.
+
+Wraps app.app so every response carries an X-Query-Count header with the
+number of SQL statements the request executed, as counted by
+src.metrics. Serve it with `gunicorn benchmarks.bench_app:app`.
+"""
+from flask import g
+
+from app import app
+
+
+@app.after_request
+def add_query_count(response):
+    stats = g.get('request_stats')
+    response.headers["X-Query-Count"] = str(stats.sql_count if stats else 0)
+    return response
@@ -0,0 +1,10 @@
+"""ASGI entry point for benchmark runs.
+
+Same as asgi.py but built on benchmarks.bench_app, so responses carry
+the X-Query-Count header. Serve it with
+`uvicorn benchmarks.bench_asgi:app`.
+"""
+from benchmarks.bench_app import app as flask_app
+from src.async_api import AsyncQuizApp
+
+app = AsyncQuizApp(flask_app)
@@ -0,0 +1,310 @@
+"""Load-test the quiz backend and write machine-readable results.
+
+Seeds a synthetic dataset into the database named by --database-url,
+starts gunicorn on benchmarks.bench_app:app (or, with --server asgi,
+uvicorn on benchmarks.bench_asgi:app) and drives every endpoint at a
+fixed concurrency. Run from quiz-game/backend:
+
+    python -m benchmarks.run --database-url postgresql+psycopg2://... \
+        --users 1000 --questions-per-level 10 --attempts 20 \
+        --concurrency 16 --requests 2000 --output bench.json
+
+Compare two runs with `python -m benchmarks.run --compare old.json new.json`.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ENDPOINTS = [
+    "login",
+    "register",
+    "questions",
+    "submit",
+    "quiz-history",
+    "quiz-history-page",
+    "user-progress",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex((host, port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"server did not start listening on {host}:{port}")
+
+
+class Client:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as response:
+                payload = response.read()
+                status = response.status
+                queries = response.headers.get("X-Query-Count")
+        except urllib.error.HTTPError as error:
+            payload = error.read()
+            status = error.code
+            queries = error.headers.get("X-Query-Count")
+        elapsed = time.perf_counter() - start
+        return status, elapsed, int(queries) if queries is not None else None, len(payload)
+
+
+class Scenario:
+    """Builds one request per call for each benchmarked endpoint"""
+
+    def __init__(self, client, tokens, usernames, level_questions, password):
+        self.client = client
+        self.tokens = tokens
+        self.usernames = usernames
+        self.level_questions = level_questions
+        self.password = password
+        self.local = threading.local()
+
+    def rng(self):
+        if not hasattr(self.local, "rng"):
+            self.local.rng = random.Random()
+        return self.local.rng
+
+    def call(self, endpoint):
+        rng = self.rng()
+        token = rng.choice(self.tokens)
+        if endpoint == "login":
+            body = {"username": rng.choice(self.usernames), "password": self.password}
+            return self.client.request("POST", "/login", body)
+        if endpoint == "register":
+            body = {"username": f"r{uuid.uuid4().hex[:12]}", "password": self.password}
+            return self.client.request("POST", "/register", body)
+        if endpoint == "questions":
+            return self.client.request("GET", "/api/questions", token=token)
+        if endpoint == "submit":
+            questions = self.level_questions[rng.choice(sorted(self.level_questions))]
+            answers = {str(question_id): rng.randrange(4) for question_id in questions}
+            return self.client.request("POST", "/api/submit", {"answers": answers}, token=token)
+        if endpoint == "quiz-history":
+            return self.client.request("GET", "/api/quiz-history", token=token)
+        if endpoint == "quiz-history-page":
+            return self.client.request("GET", "/api/quiz-history?limit=20", token=token)
+        if endpoint == "user-progress":
+            return self.client.request("GET", "/api/user-progress", token=token)
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def run_endpoint(scenario, endpoint, requests, concurrency):
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for result in pool.map(lambda _: scenario.call(endpoint), range(requests)):
+            results.append(result)
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _, _ in results)
+    queries = [count for _, _, count, _ in results if count is not None]
+    errors = sum(1 for status, _, _, _ in results if status >= 400)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "sql_queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+        "mean_response_bytes": round(statistics.fmean(size for _, _, _, size in results), 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare(args):
+    """Seed the database and collect tokens and question ids for the scenarios"""
+    os.environ["DATABASE_URL"] = args.database_url
+    from flask_jwt_extended import create_access_token
+
+    from app import app
+    from benchmarks.seed import BENCH_PASSWORD, seed_dataset
+    from src.models import Question, User
+    from src.shared import db
+
+    with app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed_dataset(args.users, args.questions_per_level, args.attempts, seed=args.seed)
+            print(f"Seeded {args.users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        users = db.session.query(User.id, User.username).filter(User.username.like("bench%")).all()
+        sample = random.Random(args.seed).sample(users, min(len(users), args.token_users))
+        tokens = [create_access_token(identity=str(user.id)) for user in sample]
+        usernames = [user.username for user in sample]
+        level_questions = {}
+        for question in db.session.query(Question.id, Question.level).order_by(Question.id):
+            level_questions.setdefault(question.level, []).append(question.id)
+
+    return tokens, usernames, level_questions, BENCH_PASSWORD
+
+
+def start_server(args):
+    # gunicorn.conf.py and the pool sizing read these; the benchmark runs
+    # single-threaded workers unless GUNICORN_THREADS says otherwise.
+    env = dict(os.environ, DATABASE_URL=args.database_url, WEB_CONCURRENCY=str(args.workers))
+    env.setdefault("GUNICORN_THREADS", "1")
+    if args.server == "asgi":
+        command = [
+            sys.executable, "-m", "uvicorn",
+            "--workers", str(args.workers),
+            "--host", "127.0.0.1", "--port", str(args.port),
+            "--no-access-log",
+            *args.server_arg,
+            "benchmarks.bench_asgi:app",
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "gunicorn",
+            "-w", str(args.workers),
+            "-b", f"127.0.0.1:{args.port}",
+            *args.server_arg,
+            "benchmarks.bench_app:app",
+        ]
+    process = subprocess.Popen(command, env=env)
+    wait_for_port("127.0.0.1", args.port)
+    return process
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{'endpoint':<20}{'rps':>26}{'p50 ms':>28}{'p99 ms':>28}{'queries':>20}")
+    for endpoint, after in new["endpoints"].items():
+        before = old["endpoints"].get(endpoint)
+        if not before:
+            continue
+
+        def cell(getter):
+            a, b = getter(before), getter(after)
+            if a is None or b is None:
+                return "n/a"
+            change = f" ({(b - a) / a * 100:+.0f}%)" if a else ""
+            return f"{a:g}->{b:g}{change}"
+
+        print(f"{endpoint:<20}"
+              f"{cell(lambda r: r['throughput_rps']):>26}"
+              f"{cell(lambda r: r['latency_ms']['p50']):>28}"
+              f"{cell(lambda r: r['latency_ms']['p99']):>28}"
+              f"{cell(lambda r: r['sql_queries_per_request']):>20}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="Database to seed and serve from. It is dropped and recreated.")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi",
+                        help="gunicorn sync workers (wsgi) or uvicorn with the async read path (asgi)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--questions-per-level", type=int, default=10)
+    parser.add_argument("--attempts", type=int, default=20, help="Historical attempts per user")
+    parser.add_argument("--token-users", type=int, default=100, help="How many users send requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in the database")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per endpoint")
+    parser.add_argument("--workers", type=int, default=4, help="Server worker processes")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server-arg", "--gunicorn-arg", dest="server_arg", action="append", default=[],
+                        help="Extra argument passed to gunicorn or uvicorn, repeatable")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required")
+
+    tokens, usernames, level_questions, password = prepare(args)
+
+    server = None
+    if not args.url:
+        server = start_server(args)
+    client = Client(args.url or f"http://127.0.0.1:{args.port}")
+    scenario = Scenario(client, tokens, usernames, level_questions, password)
+
+    results = {
+        "revision": git_revision(),
+        "started_at": datetime.utcnow().isoformat(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "questions_per_level", "attempts", "token_users", "requests",
+                        "concurrency", "workers", "server", "seed")
+        },
+        "endpoints": {},
+    }
+    try:
+        for endpoint in args.endpoints:
+            for _ in range(args.warmup):
+                scenario.call(endpoint)
+            results["endpoints"][endpoint] = stats = run_endpoint(
+                scenario, endpoint, args.requests, args.concurrency
+            )
+            if stats["throughput_rps"] and not args.url:
+                stats["throughput_rps_per_worker"] = round(stats["throughput_rps"] / args.workers, 2)
+            print(f"{endpoint:<20} {stats['throughput_rps']:>9} rps  "
+                  f"p50 {stats['latency_ms']['p50']:>8} ms  p95 {stats['latency_ms']['p95']:>8} ms  "
+                  f"p99 {stats['latency_ms']['p99']:>8} ms  queries {stats['sql_queries_per_request']}  "
+                  f"errors {stats['errors']}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
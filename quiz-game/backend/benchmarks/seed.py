@@ -0,0 +1,108 @@
+"""Synthetic dataset for benchmark runs.
+
+Everything is inserted in batches straight into the tables, with the
+level ledger rebuilt at the end. Seeding is deterministic for a given
+random seed.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from src.models import Question, User, UserQuiz, UserQuizAnswer
+from src.leaderboards import backfill_leaderboards
+from src.progress import backfill_level_progress, get_level_question_counts
+from src.question_bank import bump_bank_version
+from src.shared import db
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 5000
+LEVELS = [1, 2, 3]
+
+
+def _batched(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def seed_dataset(users, questions_per_level, attempts, seed=0):
+    """Create a fresh schema and fill it. Call inside an app context.
+
+    Returns the seeded user ids.
+    """
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+
+    # Hashing is deliberately slow, so every user shares one hash.
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    for batch in _batched([
+        {"username": f"bench{i}", "password_hash": password_hash}
+        for i in range(users)
+    ]):
+        db.session.execute(insert(User), batch)
+
+    question_rows = []
+    for level in LEVELS:
+        for i in range(questions_per_level):
+            question_rows.append({
+                "question_text": f"Level {level} question {i}",
+                "option_a": f"L{level}Q{i} option A",
+                "option_b": f"L{level}Q{i} option B",
+                "option_c": f"L{level}Q{i} option C",
+                "option_d": f"L{level}Q{i} option D",
+                "correct_option": rng.choice("ABCD"),
+                "level": level,
+            })
+    for batch in _batched(question_rows):
+        db.session.execute(insert(Question), batch)
+
+    user_ids = [row.id for row in db.session.query(User.id).order_by(User.id)]
+    questions = {level: [] for level in LEVELS}
+    for question in db.session.query(Question.id, Question.level, Question.correct_option):
+        questions[question.level].append((question.id, "ABCD".index(question.correct_option)))
+
+    now = datetime.utcnow()
+    pending = []
+
+    def flush():
+        quiz_ids = db.session.execute(
+            insert(UserQuiz).returning(UserQuiz.id, sort_by_parameter_order=True),
+            [quiz for quiz, _ in pending]
+        ).scalars().all()
+        answers = []
+        for quiz_id, (quiz, quiz_answers) in zip(quiz_ids, pending):
+            for answer in quiz_answers:
+                answers.append({**answer, "user_quiz_id": quiz_id, "submitted_at": quiz["submitted_at"]})
+        for batch in _batched(answers):
+            db.session.execute(insert(UserQuizAnswer), batch)
+        pending.clear()
+
+    for user_id in user_ids:
+        skill = rng.uniform(0.4, 0.95)
+        for attempt in range(attempts):
+            level = LEVELS[min(attempt * len(LEVELS) // max(attempts, 1), len(LEVELS) - 1)]
+            score = 0
+            quiz_answers = []
+            for question_id, correct_index in questions[level]:
+                selected_index = correct_index if rng.random() < skill else rng.randrange(4)
+                score += selected_index == correct_index
+                quiz_answers.append({"question_id": question_id, "selected_index": selected_index})
+            pending.append(({
+                "user_id": user_id,
+                "score": score,
+                "submitted_at": now - timedelta(minutes=rng.randrange(60 * 24 * 180)),
+                "level": level,
+                "total_questions": len(quiz_answers),
+            }, quiz_answers))
+            if len(pending) * questions_per_level >= BATCH_SIZE:
+                flush()
+    if pending:
+        flush()
+
+    bump_bank_version()
+    db.session.commit()
+    backfill_level_progress()
+    backfill_leaderboards(len(get_level_question_counts()))
+    return user_ids
@@ -0,0 +1,19 @@
+"""gunicorn settings, read from the same environment as app.py.
+
+WEB_CONCURRENCY and GUNICORN_THREADS also size each worker's database
+pool (see src/database.py), so set them here rather than on the command
+line.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Restart workers on code changes; for development only.
+reload = os.environ.get('GUNICORN_RELOAD', '').lower() in ('1', 'true', 'yes')
+
+
+def worker_exit(server, worker):
+    # Write the answers still queued by the write-behind writer.
+    from src.answer_writer import shutdown
+    shutdown()
@@ -0,0 +1,76 @@
+"""Denormalize level and total_questions onto user_quiz, add indexes
+
+Revision ID: d24a6c0f9e18
+Revises: b83f0d6e51a7
+Create Date: 2026-10-18 11:20:51.447310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd24a6c0f9e18'
+down_revision = 'b83f0d6e51a7'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    with op.batch_alter_table('user_quiz', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('level', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('total_questions', sa.Integer(), nullable=True))
+
+    # Indexes are built concurrently and the backfill commits batch by
+    # batch so the tables stay writable while this runs.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_user_quiz_answer_user_quiz_id', 'user_quiz_answer', ['user_quiz_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_quiz_answer_question_id', 'user_quiz_answer', ['question_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_question_level', 'question', ['level'],
+                        unique=False, postgresql_concurrently=True)
+
+        connection = op.get_bind()
+        low, high = connection.execute(sa.text("SELECT min(id), max(id) FROM user_quiz")).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                connection.execute(sa.text("""
+                    UPDATE user_quiz
+                    SET level = s.level, total_questions = s.total_questions
+                    FROM (
+                        SELECT a.user_quiz_id,
+                               (array_agg(q.level ORDER BY a.id))[1] AS level,
+                               count(*) AS total_questions
+                        FROM user_quiz_answer a
+                        JOIN question q ON q.id = a.question_id
+                        WHERE a.user_quiz_id >= :start AND a.user_quiz_id < :stop
+                        GROUP BY a.user_quiz_id
+                    ) s
+                    WHERE user_quiz.id = s.user_quiz_id
+                """), {"start": start, "stop": start + BATCH_SIZE})
+                connection.execute(sa.text("""
+                    UPDATE user_quiz SET total_questions = 0
+                    WHERE id >= :start AND id < :stop AND total_questions IS NULL
+                """), {"start": start, "stop": start + BATCH_SIZE})
+
+        op.create_index('ix_user_quiz_user_level_score', 'user_quiz',
+                        ['user_id', 'level', sa.text('score DESC')],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_quiz_user_submitted', 'user_quiz',
+                        ['user_id', sa.text('submitted_at DESC'), sa.text('id DESC')],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_quiz_user_submitted', table_name='user_quiz')
+    op.drop_index('ix_user_quiz_user_level_score', table_name='user_quiz')
+    op.drop_index('ix_question_level', table_name='question')
+    op.drop_index('ix_user_quiz_answer_question_id', table_name='user_quiz_answer')
+    op.drop_index('ix_user_quiz_answer_user_quiz_id', table_name='user_quiz_answer')
+
+    with op.batch_alter_table('user_quiz', schema=None) as batch_op:
+        batch_op.drop_column('total_questions')
+        batch_op.drop_column('level')
@@ -0,0 +1,75 @@
+"""Store the selected option as an index
+
+Revision ID: f5a93e27c6b1
+Revises: d24a6c0f9e18
+Create Date: 2026-10-18 13:41:09.226581
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a93e27c6b1'
+down_revision = 'd24a6c0f9e18'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 50000
+
+# The correct option wins when two options share the same text, so the
+# backfill grades exactly like the old text comparison did. Answers saved
+# before 025b9ba32c0f are bare letters.
+SELECTED_INDEX = """
+    CASE
+        WHEN a.selected_option = CASE upper(q.correct_option)
+                                     WHEN 'A' THEN q.option_a
+                                     WHEN 'B' THEN q.option_b
+                                     WHEN 'C' THEN q.option_c
+                                     WHEN 'D' THEN q.option_d
+                                 END
+            THEN strpos('ABCD', upper(q.correct_option)) - 1
+        WHEN a.selected_option = q.option_a THEN 0
+        WHEN a.selected_option = q.option_b THEN 1
+        WHEN a.selected_option = q.option_c THEN 2
+        WHEN a.selected_option = q.option_d THEN 3
+        WHEN upper(a.selected_option) IN ('A', 'B', 'C', 'D')
+            THEN strpos('ABCD', upper(a.selected_option)) - 1
+    END
+"""
+
+
+def upgrade():
+    with op.batch_alter_table('user_quiz_answer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('selected_index', sa.SmallInteger(), nullable=True))
+
+    # Text is only kept for answers that match no option.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        low, high = connection.execute(sa.text("SELECT min(id), max(id) FROM user_quiz_answer")).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                connection.execute(sa.text(f"""
+                    UPDATE user_quiz_answer
+                    SET selected_index = s.selected_index,
+                        selected_option = CASE WHEN s.selected_index IS NULL
+                                               THEN user_quiz_answer.selected_option END
+                    FROM (
+                        SELECT a.id, {SELECTED_INDEX} AS selected_index
+                        FROM user_quiz_answer a
+                        JOIN question q ON q.id = a.question_id
+                        WHERE a.id >= :start AND a.id < :stop
+                    ) s
+                    WHERE user_quiz_answer.id = s.id
+                """), {"start": start, "stop": start + BATCH_SIZE})
+
+
+def downgrade():
+    op.execute("""
+        UPDATE user_quiz_answer a
+        SET selected_option = (ARRAY[q.option_a, q.option_b, q.option_c, q.option_d])[a.selected_index + 1]
+        FROM question q
+        WHERE q.id = a.question_id AND a.selected_index IS NOT NULL
+    """)
+    with op.batch_alter_table('user_quiz_answer', schema=None) as batch_op:
+        batch_op.drop_column('selected_index')
@@ -0,0 +1,278 @@
+"""Write-behind persistence of submitted answers.
+
+With ANSWER_WRITE_BEHIND on, submit_quiz grades the quiz, commits its
+user_quiz row and ledger updates, and hands the answer rows and their
+question_stats increments to a per-process writer thread. The writer
+wakes every ANSWER_FLUSH_INTERVAL seconds, or as soon as
+ANSWER_FLUSH_ROWS rows are waiting, and writes up to that many rows from
+many submissions in one transaction: one batched insert of the answers
+and one aggregated question_stats upsert.
+
+The queue holds at most ANSWER_QUEUE_ROWS answer rows, counting the
+batch being written. A submission that doesn't fit is written by its own
+request, so a writer that falls behind slows submits down instead of
+growing memory; if that write fails, the answers are dropped like a
+failed flush, as the quiz itself has already committed. A quiz's
+answers show up in its history once the flush carrying them commits.
+The X-Read-After token a submit returns is taken before that, so it
+covers the quiz row and ledger but not the deferred answers.
+
+The queue is flushed when the process exits normally; a worker that is
+killed outright loses what it still held.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import insert
+
+from . import metrics
+from .models import UserQuizAnswer
+from .question_stats import record_question_answers
+from .shared import db
+
+FLUSH_ROW_BUCKETS = (1, 10, 100, 500, 1000, 2500, 5000, 10000, 25000)
+
+_lock = threading.Lock()
+_writer = None
+_writer_pid = None
+_atexit_registered = False
+
+flush_duration = metrics.Histogram(
+    "answer_flush_duration_seconds", "Time spent writing one batch of queued answers.",
+    ("outcome",), metrics.DURATION_BUCKETS
+)
+flush_rows = metrics.Histogram(
+    "answer_flush_rows", "Answer rows written per flush.", ("outcome",), FLUSH_ROW_BUCKETS
+)
+counters = {"inline_writes": 0, "dropped_rows": 0}
+
+
+def write_answers(answers, graded):
+    """Insert answer rows and add them to question_stats in the session's transaction"""
+    if answers:
+        db.session.execute(insert(UserQuizAnswer), answers)
+    record_question_answers(graded)
+
+
+class AnswerWriter:
+    """Background thread that batches queued answers into few transactions"""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_rows = app.config['ANSWER_QUEUE_ROWS']
+        self.batch_rows = app.config['ANSWER_FLUSH_ROWS']
+        self.interval = app.config['ANSWER_FLUSH_INTERVAL']
+        self.retries = app.config['ANSWER_FLUSH_RETRIES']
+        self.pending = deque()
+        self.pending_rows = 0
+        self.writing_rows = 0
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='answer-writer', daemon=True)
+        self.thread.start()
+
+    def offer(self, answers, graded):
+        """Queue one submission. False if the queue is full or shutting down."""
+        with self.condition:
+            if self.stopping or self.pending_rows + self.writing_rows + len(answers) > self.max_rows:
+                return False
+            self.pending.append((answers, graded))
+            self.pending_rows += len(answers)
+            if self.pending_rows >= self.batch_rows:
+                self.condition.notify_all()
+            return True
+
+    def depth(self):
+        """(queued submissions, answer rows queued or being written)"""
+        with self.condition:
+            return len(self.pending), self.pending_rows + self.writing_rows
+
+    def _take_batch(self):
+        batch, rows = [], 0
+        while self.pending and (not batch or rows + len(self.pending[0][0]) <= self.batch_rows):
+            answers, graded = self.pending.popleft()
+            batch.append((answers, graded))
+            rows += len(answers)
+        self.pending_rows -= rows
+        self.writing_rows = rows
+        return batch
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.stopping and self.pending_rows < self.batch_rows:
+                    self.condition.wait(self.interval)
+                if not self.pending:
+                    if self.stopping:
+                        return
+                    continue
+                batch = self._take_batch()
+            try:
+                self.flush(batch)
+            finally:
+                with self.condition:
+                    self.writing_rows = 0
+                    self.condition.notify_all()
+
+    def flush(self, batch):
+        answers = [row for rows, _ in batch for row in rows]
+        graded = [answer for _, answers_graded in batch for answer in answers_graded]
+        with self.app.app_context():
+            for attempt in range(self.retries + 1):
+                started = time.perf_counter()
+                try:
+                    write_answers(answers, graded)
+                    db.session.commit()
+                    self._observe("ok", started, len(answers))
+                    return
+                except Exception as e:
+                    db.session.rollback()
+                    self._observe("error", started, len(answers))
+                    logging.error(f"Error writing {len(answers)} queued answers: {str(e)}")
+                    if attempt < self.retries:
+                        time.sleep(min(2 ** attempt, 10))
+
+            # Write what can still be written one submission at a time.
+            for rows, submission_graded in batch:
+                try:
+                    write_answers(rows, submission_graded)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    quiz_id = rows[0]["user_quiz_id"] if rows else None
+                    logging.error(f"Dropping {len(rows)} answers of quiz {quiz_id}: {str(e)}")
+                    with _lock:
+                        counters["dropped_rows"] += len(rows)
+
+    def _observe(self, outcome, started, rows):
+        with _lock:
+            flush_duration.observe((outcome,), time.perf_counter() - started)
+            flush_rows.observe((outcome,), rows)
+
+    def drain(self, timeout=None):
+        """Wait until everything queued so far has been written. True if it was."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.condition.notify_all()
+            while self.pending or self.writing_rows:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+        """Stop taking submissions, write the rest and end the thread"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+
+def _get_writer():
+    """This process's writer, started on first use so each gunicorn worker gets its own"""
+    global _writer, _writer_pid, _atexit_registered
+    with _lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = AnswerWriter(current_app._get_current_object())
+            _writer_pid = os.getpid()
+            if not _atexit_registered:
+                atexit.register(shutdown)
+                _atexit_registered = True
+        return _writer
+
+
+def write_behind_enabled():
+    return current_app.config['ANSWER_WRITE_BEHIND']
+
+
+def persist_answers(answers, graded):
+    """Queue a committed submission's answers, or write them now if the queue is full.
+
+    Returns True if they were queued. A failed write is logged and
+    counted as dropped rather than raised.
+    """
+    if not answers and not graded:
+        return True
+    if _get_writer().offer(answers, graded):
+        return True
+    with _lock:
+        counters["inline_writes"] += 1
+    try:
+        write_answers(answers, graded)
+        db.session.commit()
+    except Exception as e:
+        # The quiz is already recorded, so the submit still succeeds.
+        db.session.rollback()
+        quiz_id = answers[0]["user_quiz_id"] if answers else None
+        logging.error(f"Dropping {len(answers)} answers of quiz {quiz_id}: {str(e)}")
+        with _lock:
+            counters["dropped_rows"] += len(answers)
+    return False
+
+
+def flush_answers(timeout=None):
+    """Block until this process's queued answers are written"""
+    with _lock:
+        writer = _writer if _writer_pid == os.getpid() else None
+    return writer.drain(timeout) if writer else True
+
+
+def shutdown(timeout=None):
+    """Flush and stop this process's writer. Safe to call more than once."""
+    global _writer
+    with _lock:
+        writer = _writer if _writer_pid == os.getpid() else None
+        _writer = None
+    if writer is None:
+        return True
+    if timeout is None:
+        timeout = writer.app.config['ANSWER_SHUTDOWN_TIMEOUT']
+    if not writer.stop(timeout):
+        queued, rows = writer.depth()
+        logging.error(f"Answer writer did not finish within {timeout}s, {rows} answers of {queued} quizzes lost")
+        return False
+    return True
+
+
+def metric_lines():
+    with _lock:
+        writer = _writer if _writer_pid == os.getpid() else None
+    queued, rows = writer.depth() if writer else (0, 0)
+    lines = [
+        "# HELP answer_queue_rows Answer rows waiting for the write-behind writer, including the batch being written.",
+        "# TYPE answer_queue_rows gauge",
+        f"answer_queue_rows {rows}",
+        "# HELP answer_queue_submissions Submissions waiting for the write-behind writer.",
+        "# TYPE answer_queue_submissions gauge",
+        f"answer_queue_submissions {queued}",
+    ]
+    with _lock:
+        lines.extend([
+            "# HELP answer_inline_writes_total Submissions written by the request because the queue was full.",
+            "# TYPE answer_inline_writes_total counter",
+            f"answer_inline_writes_total {counters['inline_writes']}",
+            "# HELP answer_dropped_rows_total Queued answer rows that could not be written.",
+            "# TYPE answer_dropped_rows_total counter",
+            f"answer_dropped_rows_total {counters['dropped_rows']}",
+        ])
+        lines.extend(flush_duration.render())
+        lines.extend(flush_rows.render())
+    return lines
+
+
+def init_app(app):
+    """Fill in the write-behind defaults and publish the queue metrics"""
+    app.config.setdefault('ANSWER_WRITE_BEHIND', False)
+    app.config.setdefault('ANSWER_QUEUE_ROWS', 50000)
+    app.config.setdefault('ANSWER_FLUSH_ROWS', 5000)
+    app.config.setdefault('ANSWER_FLUSH_INTERVAL', 0.2)
+    app.config.setdefault('ANSWER_FLUSH_RETRIES', 3)
+    app.config.setdefault('ANSWER_SHUTDOWN_TIMEOUT', 30)
+    metrics.add_collector(metric_lines)
@@ -0,0 +1,204 @@
+"""Async serving path for the read-heavy quiz endpoints.
+
+GET /api/questions, /api/user-progress and /api/quiz-history run on the
+event loop with asyncpg and async SQLAlchemy sessions; every other
+request goes to the Flask app through a WSGI adapter thread pool. Each
+native request runs inside a Flask request context, so JWT checks, the
+before/after request hooks (CORS, metrics) and the response builders
+are the ones the sync routes use. Queries that don't depend on each
+other, like the bank version and the user's ledger, run concurrently on
+separate sessions. With a read replica configured, the native views read
+from it under the same X-Read-After rule as the sync ones.
+"""
+import asyncio
+import io
+import logging
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .answer_writer import shutdown as shutdown_answer_writer
+from .database import (
+    REPLAYED_LSN_SQL, async_engine_options, note_replica_lsn, read_after_position, replica_has,
+    set_transaction_timeout
+)
+from .models import QuestionBankMeta, UserLevelProgress
+from .question_bank import cached_question_bank, get_question_bank
+from .routes import (
+    HISTORY_MAX_PAGE_SIZE, history_response, history_statement, parse_history_args,
+    parse_questions_args, questions_response, user_progress_payload
+)
+
+
+def async_database_url(uri):
+    """The asyncpg flavour of a SQLAlchemy PostgreSQL URL"""
+    return make_url(uri).set(drivername='postgresql+asyncpg')
+
+
+class AsyncQuizApp:
+    """ASGI app serving the quiz read endpoints natively and the rest through flask_app"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config.get('ASYNC_WSGI_THREADS', 10))
+        self.engines = {}
+        self.sessions = {}
+        self.views = {
+            '/api/questions': self.questions,
+            '/api/user-progress': self.user_progress,
+            '/api/quiz-history': self.quiz_history,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        view = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            view = self.views.get(scope['path'])
+        if view is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        environ = build_environ(scope, io.BytesIO())
+        response = await self.dispatch(environ, view)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response.headers.items()],
+        })
+        # get_app_iter drops the body of 304 and HEAD responses like WSGI does.
+        await send({'type': 'http.response.body', 'body': b''.join(response.get_app_iter(environ))})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.to_thread(shutdown_answer_writer)
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session(self, replica=None):
+        """A new session on the primary, or on the replica inside a replica request"""
+        if replica is None:
+            replica = g.get('db_replica', False)
+        if replica not in self.sessions:
+            config = self.flask_app.config
+            if replica:
+                url = async_database_url(config['DATABASE_REPLICA_URL'])
+            else:
+                url = config.get('ASYNC_DATABASE_URL') or async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+            engine = create_async_engine(url, **async_engine_options(config))
+            if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']:
+                set_transaction_timeout(engine.sync_engine, config['DB_STATEMENT_TIMEOUT_MS'])
+            self.engines[replica] = engine
+            self.sessions[replica] = async_sessionmaker(engine, expire_on_commit=False)
+        return self.sessions[replica]()
+
+    async def use_replica(self):
+        """database.use_replica without blocking the event loop"""
+        if not self.flask_app.config.get('DATABASE_REPLICA_URL'):
+            return False
+        position = read_after_position()
+        if position is None:
+            return False
+        if replica_has(position):
+            return True
+        try:
+            async with self.session(replica=True) as session:
+                replayed = (await session.execute(text(REPLAYED_LSN_SQL))).scalar()
+        except Exception as e:
+            logging.error(f"Error checking replica position: {str(e)}")
+            return False
+        return position <= note_replica_lsn(replayed)
+
+    async def dispatch(self, environ, view):
+        """Run view(user_id) the way Flask's full_dispatch_request runs a sync view"""
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        verify_jwt_in_request()
+                        g.db_replica = await self.use_replica()
+                        rv = await view(int(get_jwt_identity()))
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                return app.finalize_request(rv)
+            except Exception as e:
+                return app.handle_exception(e)
+
+    async def question_bank(self):
+        bank = cached_question_bank()
+        if bank is None:
+            async with self.session() as session:
+                version = (await session.execute(
+                    select(QuestionBankMeta.version).where(QuestionBankMeta.id == 1)
+                )).scalar()
+            bank = cached_question_bank(version or 0)
+        if bank is None:
+            # The bank changed: reload it once through the sync path.
+            bank = await asyncio.to_thread(get_question_bank)
+        return bank
+
+    async def ledger(self, user_id):
+        async with self.session() as session:
+            rows = (await session.execute(
+                select(UserLevelProgress).where(UserLevelProgress.user_id == user_id)
+            )).scalars().all()
+        return {row.level: row for row in rows}
+
+    async def rows(self, statement):
+        async with self.session() as session:
+            return (await session.execute(statement)).all()
+
+    async def questions(self, user_id):
+        try:
+            try:
+                count, seed = parse_questions_args()
+            except ValueError:
+                return jsonify({"error": "count must be a positive integer and seed an integer"}), 400
+            bank, ledger = await asyncio.gather(self.question_bank(), self.ledger(user_id))
+            return questions_response(user_id, bank, ledger, count, seed)
+
+        except Exception as e:
+            logging.error(f"Error fetching questions: {str(e)}")
+            return jsonify({"error": "Failed to fetch questions"}), 500
+
+    async def user_progress(self, user_id):
+        try:
+            bank, ledger = await asyncio.gather(self.question_bank(), self.ledger(user_id))
+            return jsonify(user_progress_payload(user_id, bank.level_counts, ledger)), 200
+
+        except Exception as e:
+            logging.error(f"Error fetching user progress: {str(e)}")
+            return jsonify({"error": "Failed to fetch progress"}), 500
+
+    async def quiz_history(self, user_id):
+        try:
+            try:
+                paginated, summary_only, limit, cursor = parse_history_args()
+            except ValueError:
+                return jsonify({"message": f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE} and cursor must come from next_cursor"}), 400
+
+            statement = history_statement(user_id, summary_only, limit, cursor)
+            if summary_only:
+                rows, bank = await self.rows(statement), None
+            else:
+                rows, bank = await asyncio.gather(self.rows(statement), self.question_bank())
+            return history_response(rows, bank, paginated, summary_only, limit)
+
+        except Exception as e:
+            logging.error(f"Error fetching quiz history: {str(e)}")
+            return jsonify({"message": "Error fetching quiz history", "error": str(e)}), 500
@@ -0,0 +1,61 @@
+import hashlib
+import hmac
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+
+class AttemptError(Exception):
+    """A submitted attempt token that cannot be graded"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['JWT_SECRET_KEY'], salt='quiz-attempt')
+
+
+def default_attempt_seed(user_id, level, attempt_number):
+    """Sampling seed for an attempt when the client doesn't pick one.
+
+    Keyed on the app secret so users can't predict their next draw, and
+    stable until the attempt is submitted so reloading the quiz shows
+    the same questions.
+    """
+    message = f"{user_id}:{level}:{attempt_number}".encode()
+    digest = hmac.new(current_app.config['JWT_SECRET_KEY'].encode(), message, hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+def issue_attempt_token(user_id, level, bank_version, attempt_number, seed=None, count=None):
+    """Sign the attempt a user is about to take.
+
+    attempt_number is how many attempts the user had already made at
+    this level. It only moves when an attempt is submitted, so the
+    token stays the same until then and a submitted token can't be
+    replayed. The question ids are not stored; they are re-derived from
+    the bank version, level, seed and count.
+    """
+    return _serializer().dumps([user_id, level, bank_version, attempt_number, seed, count])
+
+
+def load_attempt_token(token, user_id):
+    """Verify a token from issue_attempt_token and return its fields"""
+    try:
+        token_user_id, level, bank_version, attempt_number, seed, count = _serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        raise AttemptError("Invalid attempt token")
+
+    if token_user_id != user_id:
+        raise AttemptError("Invalid attempt token")
+
+    return {
+        "level": level,
+        "bank_version": bank_version,
+        "attempt_number": attempt_number,
+        "seed": seed,
+        "count": count,
+    }
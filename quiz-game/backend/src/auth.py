@@ -1,4 +1,52 @@
-from flask import Blueprint
+import io
+import logging
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+
+from .passwords import bulk_hasher
+from .provisioning import ImportFormatError, detect_format, import_users, read_user_rows, summarize_results
+from .shared import db
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+
+def is_admin(identity):
+    """Whether a JWT identity is listed in ADMIN_USER_IDS"""
+    return identity is not None and identity in current_app.config['ADMIN_USER_IDS']
+
+
+def admin_required(fn):
+    """jwt_required, and the user id must be listed in ADMIN_USER_IDS"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin(get_jwt_identity()):
+            return jsonify({"error": "Admin access required"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@auth_bp.route('/users/import', methods=['POST'])
+@admin_required
+def import_users_endpoint():
+    """Create many users from a CSV or NDJSON request body in one transaction"""
+    fmt = request.args.get('format') or detect_format(request.mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"}), 400
+
+    try:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        with bulk_hasher(current_app.config['PASSWORD_BULK_WORKERS']) as hash_batch:
+            results = import_users(read_user_rows(stream, fmt), hash_batch)
+        db.session.commit()
+        return jsonify({**summarize_results(results), "results": results}), 200
+
+    except (ImportFormatError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error importing users: {str(e)}")
+        return jsonify({"error": "Failed to import users"}), 500
@@ -0,0 +1,253 @@
+import json
+import pstats
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .leaderboards import backfill_leaderboards
+from .partitions import (
+    PARTITIONED_TABLES, add_months, archivable_months, archive_month, create_month_partitions, default_months,
+    list_partitions, month_start, partition_name
+)
+from .passwords import bulk_hasher
+from .profiling import list_profiles
+from .progress import backfill_level_progress, get_level_question_counts
+from .question_stats import backfill_question_stats
+from .question_io import QuestionImportError, copy_questions_to, import_questions
+from .results_export import ExportFilterError, decode_export_cursor, parse_export_filters, stream_results
+from .provisioning import ImportFormatError, detect_format, import_users, read_user_rows, summarize_results
+from .shared import db
+
+quiz_cli = AppGroup('quiz', help='Quiz maintenance commands.')
+
+
+@quiz_cli.command('backfill-progress')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s ledger.')
+def backfill_progress_command(user_id):
+    """Rebuild user_level_progress from existing user_quiz data."""
+    rows = backfill_level_progress(user_id)
+    click.echo(f"Wrote {rows} level progress rows")
+
+
+@quiz_cli.command('backfill-question-stats')
+@click.option('--question-id', 'question_ids', type=int, multiple=True,
+              help='Only rebuild the counters of this question. Repeatable.')
+def backfill_question_stats_command(question_ids):
+    """Rebuild question_stats from existing user_quiz_answer data."""
+    rows = backfill_question_stats(question_ids)
+    click.echo(f"Wrote {rows} question stats rows")
+
+
+@quiz_cli.command('backfill-leaderboards')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Only rebuild this user\'s rows. Repeatable.')
+def backfill_leaderboards_command(user_ids):
+    """Rebuild leaderboard_entry from the level ledger and user_quiz. Run backfill-progress first."""
+    rows = backfill_leaderboards(len(get_level_question_counts()), user_ids=user_ids or None)
+    click.echo(f"Wrote {rows} leaderboard rows")
+
+
+@quiz_cli.command('profiles')
+@click.option('--limit', type=int, default=20, help='How many of the newest profiles to list.')
+def profiles_command(limit):
+    """List the request profiles in PROFILE_DIR, newest first."""
+    for meta in list_profiles(current_app.config['PROFILE_DIR'])[:limit]:
+        click.echo(
+            f"{meta['recorded_at']}  {meta['method']} {meta['path']} -> {meta['status']}  "
+            f"{meta['duration_ms']} ms  sql={meta['sql_count']}  user={meta['user_id']}  {meta['profile']}"
+        )
+
+
+@quiz_cli.command('show-profile')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--sort', default='cumulative', help='pstats sort key.')
+@click.option('--limit', type=int, default=30, help='How many functions to print.')
+def show_profile_command(path, sort, limit):
+    """Print the hottest functions of one request profile."""
+    pstats.Stats(path).strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+@quiz_cli.command('import-users')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format. Guessed from the file extension when omitted.')
+@click.option('--workers', type=int, default=None, help='Hashing processes, one per core by default.')
+@click.option('--results', type=click.File('w'), default=None, help='Write one NDJSON result per row here.')
+def import_users_command(source, fmt, workers, results):
+    """Create users from a CSV or NDJSON file with username and password fields. Use - for stdin."""
+    fmt = fmt or detect_format(source.name)
+    if fmt is None:
+        raise click.UsageError("Can't tell the format from the file name, pass --format")
+
+    try:
+        with bulk_hasher(workers) as hash_batch:
+            rows = import_users(read_user_rows(source, fmt), hash_batch)
+    except ImportFormatError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+
+    for row in rows:
+        if results:
+            results.write(json.dumps(row) + "\n")
+        elif row['status'] != 'created':
+            click.echo(f"row {row['row']}: {row['username']!r} {row['status']} {row.get('error', '')}".rstrip())
+    summary = summarize_results(rows)
+    click.echo(", ".join(f"{count} {status}" for status, count in summary.items()))
+
+
+@quiz_cli.command('import-questions')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format. Guessed from the file extension when omitted.')
+def import_questions_command(source, fmt):
+    """Upsert questions from a CSV or NDJSON file, matched on question text. Use - for stdin."""
+    fmt = fmt or detect_format(source.name)
+    if fmt is None:
+        raise click.UsageError("Can't tell the format from the file name, pass --format")
+
+    try:
+        counts = import_questions(source, fmt)
+    except QuestionImportError as e:
+        db.session.rollback()
+        for row in e.invalid_rows:
+            click.echo(f"row {row['row']}: {row['error']}", err=True)
+        raise click.ClickException(e.message)
+    db.session.commit()
+    click.echo(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+@quiz_cli.command('export-questions')
+@click.argument('target', type=click.File('wb'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv')
+def export_questions_command(target, fmt):
+    """Write the whole question bank as CSV or NDJSON. Defaults to stdout."""
+    copy_questions_to(target, fmt)
+
+
+@quiz_cli.command('export-results')
+@click.argument('target', type=click.File('ab'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv')
+@click.option('--user-id', 'user_ids', multiple=True, help='Only this user\'s quizzes. Repeatable.')
+@click.option('--level', default=None, help='Only quizzes of this level.')
+@click.option('--since', default=None, help='Only quizzes submitted at or after this ISO date or datetime.')
+@click.option('--until', default=None, help='Only quizzes submitted before this ISO date or datetime.')
+@click.option('--cursor', default=None, help='Resume after the row with this cursor, appending to TARGET.')
+def export_results_command(target, fmt, user_ids, level, since, until, cursor):
+    """Stream stored answers with their quizzes, users and questions as CSV or NDJSON. Defaults to stdout."""
+    try:
+        filters = parse_export_filters(user_ids, level, since, until)
+        position = decode_export_cursor(cursor) if cursor else None
+    except ExportFilterError as e:
+        raise click.UsageError(str(e))
+    if position is None and target.seekable() and target.tell():
+        raise click.UsageError("TARGET already has data, pass --cursor to resume or choose a new file")
+    for chunk in stream_results(fmt, filters, position):
+        target.write(chunk)
+
+
+@quiz_cli.command('regrade')
+@click.option('--question-id', 'question_ids', type=int, multiple=True,
+              help='Only regrade quizzes that answered this question. Repeatable.')
+@click.option('--dry-run', is_flag=True, help='Show what would change without writing anything.')
+@click.option('--chunk-size', type=int, default=None, help='Quizzes graded per chunk.')
+@click.option('--show', type=int, default=50, help='How many changed scores to print.')
+def regrade_command(question_ids, dry_run, chunk_size, show):
+    """Recompute stored quiz scores against the current answer keys."""
+    # NumPy is only needed here, so web workers don't pay for importing it.
+    from .regrade import QUIZ_CHUNK_SIZE, regrade_scores
+
+    shown = []
+
+    def on_change(quiz_id, user_id, level, old, new):
+        if len(shown) < show:
+            shown.append(quiz_id)
+            click.echo(f"quiz {quiz_id} user {user_id} level {level}: {old} -> {new}")
+
+    totals = regrade_scores(question_ids, dry_run=dry_run, chunk_size=chunk_size or QUIZ_CHUNK_SIZE,
+                            on_change=on_change)
+    verb = "would change" if dry_run else "changed"
+    click.echo(f"{totals['quizzes']} quizzes checked, {totals['changed']} scores {verb}, "
+               f"{totals['users']} users affected")
+
+
+@quiz_cli.command('rebalance-levels')
+@click.option('--apply', is_flag=True, help='Write the suggested levels. Without it nothing changes.')
+@click.option('--band', 'bands', type=(int, float, float), multiple=True, metavar='LEVEL LOW HIGH',
+              help='Target pass-rate band for a level, e.g. --band 1 0.75 0.95. Repeatable.')
+@click.option('--min-attempts', type=int, default=None, help='Questions answered fewer times keep their level.')
+@click.option('--quiz-size', type=int, default=None, help='Questions per attempt. Defaults to the whole level.')
+@click.option('--show', type=int, default=20, help='How many moves to print.')
+def rebalance_levels_command(apply, bands, min_attempts, quiz_size, show):
+    """Suggest or apply question levels from observed correct rates in question_stats."""
+    from .rebalance import DEFAULT_MIN_ATTEMPTS, DEFAULT_PASS_BANDS, rebalance_levels
+
+    targets = dict(DEFAULT_PASS_BANDS)
+    for level, low, high in bands:
+        if level not in targets or not 0 <= low <= high <= 1:
+            raise click.BadParameter(f"{level} {low} {high}", param_hint='--band')
+        targets[level] = (low, high)
+
+    report, moves = rebalance_levels(
+        apply=apply, bands=targets, quiz_size=quiz_size,
+        min_attempts=DEFAULT_MIN_ATTEMPTS if min_attempts is None else min_attempts
+    )
+
+    click.echo(f"{report['measured_questions']} questions with enough attempts")
+    for level, band in report['bands'].items():
+        before, after = report['before'][level], report['after'][level]
+        click.echo(
+            f"level {level} band {band[0]:.2f}-{band[1]:.2f}: "
+            f"{before['questions']} -> {after['questions']} questions, "
+            f"pass rate {before['estimated_pass_rate']} -> {after['estimated_pass_rate']}, "
+            f"correct rate {before['mean_correct_rate']} -> {after['mean_correct_rate']}"
+        )
+    for question_id, old, new in moves[:show]:
+        click.echo(f"question {question_id}: level {old} -> {new}")
+    verb = "moved" if apply else "would move"
+    click.echo(f"{len(moves)} questions {verb}")
+
+
+@quiz_cli.command('maintain-partitions')
+@click.option('--months-ahead', type=int, default=None,
+              help='Months after this one that should already have partitions. Defaults to PARTITION_MONTHS_AHEAD.')
+@click.option('--archive-after', type=int, default=None,
+              help='Archive months that ended this many months ago or more. Defaults to ARCHIVE_AFTER_MONTHS; '
+                   'nothing is archived when neither is set.')
+@click.option('--archive-dir', type=click.Path(file_okay=False), default=None,
+              help='Where archived partitions are written. Defaults to ARCHIVE_DIR.')
+@click.option('--drop', is_flag=True, help='Drop archived partitions instead of leaving them detached.')
+@click.option('--dry-run', is_flag=True, help='Show what would be created and archived without changing anything.')
+def maintain_partitions_command(months_ahead, archive_after, archive_dir, drop, dry_run):
+    """Create upcoming monthly partitions of the quiz tables and archive old ones."""
+    config = current_app.config
+    months_ahead = config['PARTITION_MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    archive_after = config['ARCHIVE_AFTER_MONTHS'] if archive_after is None else archive_after
+    archive_dir = archive_dir or config['ARCHIVE_DIR']
+    this_month = month_start(datetime.utcnow().date())
+
+    # Months that only the DEFAULT partition holds rows for get their own
+    # partitions too, so they can be archived later.
+    upcoming = [add_months(this_month, offset) for offset in range(months_ahead + 1)]
+    attached = {partition['name'] for partition in list_partitions(PARTITIONED_TABLES[0])}
+    for month in sorted(set(default_months()) | set(upcoming)):
+        if partition_name(PARTITIONED_TABLES[0], month) in attached:
+            continue
+        if dry_run:
+            click.echo(f"would create the {month:%Y-%m} partitions")
+        else:
+            click.echo(f"created {', '.join(create_month_partitions(month)) or 'nothing'}")
+
+    if archive_after is None:
+        return
+    if archive_after < 1:
+        raise click.BadParameter("must be at least 1", param_hint='--archive-after')
+    estimates = {partition['month']: partition['rows_estimate'] for partition in list_partitions(PARTITIONED_TABLES[0])}
+    for month in archivable_months(add_months(this_month, -archive_after)):
+        if dry_run:
+            click.echo(f"would archive {month:%Y-%m} (about {estimates.get(month, 0)} quizzes) to {archive_dir}")
+            continue
+        result = archive_month(month, archive_dir, drop=drop)
+        verb = "dropped" if result['dropped'] else "detached"
+        click.echo(f"archived {result['month']}: {result['quizzes']} quizzes, {result['answers']} answers, "
+                   f"{verb}, manifest {result['manifest']}")
@@ -0,0 +1,201 @@
+"""Connection pool sizing and the read replica.
+
+init_app builds the engine options from the DB_* settings. By default
+each gunicorn worker keeps one pooled connection per thread, and
+DB_MAX_CONNECTIONS caps the pools of all WEB_CONCURRENCY workers
+together; a cap below one connection per worker fails at startup. With DB_PGBOUNCER the pooler owns the connections: the app
+opens one per checkout, sets the statement timeout per transaction
+instead of as a startup option, and the async driver skips prepared
+statements.
+
+With DATABASE_REPLICA_URL set, views wrapped in replica_reads run their
+queries on the replica. Writes always go to the primary. A client that
+sends back the X-Read-After token from its last write stays on the
+primary until the replica has replayed up to that point.
+"""
+import logging
+import threading
+from functools import wraps
+
+from flask import current_app, g, request
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool
+
+from .shared import REPLICA_BIND, db
+
+READ_AFTER_HEADER = 'X-Read-After'
+
+_lock = threading.Lock()
+_replica_lsn = {"replayed": 0}
+
+
+def pool_sizes(config):
+    """(pool_size, max_overflow) for one worker process"""
+    size = config['DB_POOL_SIZE'] or config['GUNICORN_THREADS']
+    overflow = config['DB_MAX_OVERFLOW']
+    budget = config['DB_MAX_CONNECTIONS']
+    if budget:
+        workers = max(1, config['WEB_CONCURRENCY'])
+        if budget < workers:
+            raise ValueError(
+                f"DB_MAX_CONNECTIONS={budget} can't give each of the {workers} workers (WEB_CONCURRENCY) "
+                f"a connection; raise it or run fewer workers"
+            )
+        per_worker = budget // workers
+        size = min(size, per_worker)
+        overflow = max(0, min(overflow, per_worker - size))
+    return size, overflow
+
+
+def engine_options(config):
+    """SQLAlchemy engine options for the psycopg2 engines"""
+    if config['DB_PGBOUNCER']:
+        return {'poolclass': NullPool}
+
+    size, overflow = pool_sizes(config)
+    options = {
+        'pool_size': size,
+        'max_overflow': overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}"}
+    return options
+
+
+def async_engine_options(config):
+    """Engine options for the asyncpg engines of the async API"""
+    if config['DB_PGBOUNCER']:
+        # Transaction pooling can hand each statement a different server
+        # connection, so prepared statements must not outlive it.
+        return {'poolclass': NullPool,
+                'connect_args': {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}}
+
+    # Native requests hold up to two connections at once. Overflow
+    # connections are closed as soon as they are returned, so under load
+    # it is cheaper to queue for a bigger fixed pool.
+    options = {
+        'pool_size': config['ASYNC_POOL_SIZE'],
+        'max_overflow': config['ASYNC_POOL_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(int(config['DB_STATEMENT_TIMEOUT_MS']))}}
+    return options
+
+
+def set_transaction_timeout(engine, timeout_ms):
+    """Run SET LOCAL statement_timeout at the start of every transaction on engine"""
+    @event.listens_for(engine, 'begin')
+    def set_local_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def init_app(app):
+    """Fill in the DB_* defaults, then configure the engines and initialise db on app"""
+    config = app.config
+    config.setdefault('WEB_CONCURRENCY', 1)
+    config.setdefault('GUNICORN_THREADS', 4)
+    config.setdefault('DB_POOL_SIZE', None)
+    config.setdefault('DB_MAX_OVERFLOW', 2)
+    config.setdefault('DB_MAX_CONNECTIONS', None)
+    config.setdefault('DB_POOL_TIMEOUT', 30)
+    config.setdefault('DB_POOL_RECYCLE', 1800)
+    config.setdefault('DB_POOL_PRE_PING', True)
+    config.setdefault('DB_STATEMENT_TIMEOUT_MS', 0)
+    config.setdefault('DB_PGBOUNCER', False)
+    config.setdefault('DATABASE_REPLICA_URL', None)
+    config.setdefault('ASYNC_POOL_SIZE', 20)
+    config.setdefault('ASYNC_POOL_OVERFLOW', 0)
+
+    options = engine_options(config)
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    if config['DATABASE_REPLICA_URL']:
+        config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = {**options, 'url': config['DATABASE_REPLICA_URL']}
+    db.init_app(app)
+
+    if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']:
+        with app.app_context():
+            for engine in db.engines.values():
+                set_transaction_timeout(engine, config['DB_STATEMENT_TIMEOUT_MS'])
+
+
+def parse_lsn(token):
+    """A WAL position like 16/B374D848 as an integer, or None if it isn't one"""
+    high, sep, low = (token or '').strip().partition('/')
+    try:
+        if not sep:
+            raise ValueError(token)
+        return (int(high, 16) << 32) + int(low, 16)
+    except ValueError:
+        return None
+
+
+# On a server that isn't replaying WAL the replay position is NULL, and
+# everything committed so far is visible.
+REPLAYED_LSN_SQL = "SELECT coalesce(pg_last_wal_replay_lsn(), pg_current_wal_lsn())::text"
+
+
+def note_replica_lsn(token):
+    """Remember how far the replica has replayed and return that position"""
+    position = parse_lsn(token) or 0
+    with _lock:
+        _replica_lsn["replayed"] = max(_replica_lsn["replayed"], position)
+        return _replica_lsn["replayed"]
+
+
+def replica_has(position):
+    """Whether the replica is known to have replayed up to position"""
+    with _lock:
+        return position <= _replica_lsn["replayed"]
+
+
+def read_after_position():
+    """The X-Read-After position the client sent, 0 for none, None if malformed"""
+    token = request.headers.get(READ_AFTER_HEADER)
+    if not token:
+        return 0
+    return parse_lsn(token)
+
+
+def use_replica():
+    """Whether this request may read from the replica.
+
+    Only when a replica is configured and it has replayed the client's
+    last write. The replay position is only queried again when a token is
+    ahead of the one seen last; if that fails the primary serves the read.
+    """
+    if not current_app.config.get('DATABASE_REPLICA_URL'):
+        return False
+    position = read_after_position()
+    if position is None:
+        return False
+    if replica_has(position):
+        return True
+    try:
+        with db.engines[REPLICA_BIND].connect() as conn:
+            replayed = conn.exec_driver_sql(REPLAYED_LSN_SQL).scalar()
+    except Exception as e:
+        logging.error(f"Error checking replica position: {str(e)}")
+        return False
+    return position <= note_replica_lsn(replayed)
+
+
+def replica_reads(fn):
+    """Run the view's queries on the replica when use_replica allows it"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.db_replica = use_replica()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def write_position():
+    """Read-your-writes token for the primary's current WAL position, or None without a replica"""
+    if not current_app.config.get('DATABASE_REPLICA_URL'):
+        return None
+    return db.session.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
@@ -0,0 +1,220 @@
+"""Global and per-level leaderboards kept up to date at submit time.
+
+leaderboard_entry holds one row per user, board, level and period.
+Level 0 is the board across all levels. Boards:
+
+- best_score: best percentage at a level; across levels, their sum.
+- fewest_attempts: attempts it took to first pass a level; across
+  levels, the total for users who have passed every level.
+- weekly: quizzes submitted this week (Monday to Sunday, UTC).
+
+Top-N reads walk the (board, level, period, rank_key) index. "My rank"
+bisects a per-process histogram of rank keys, rebuilt at most every
+LEADERBOARD_REFRESH_SECONDS, so it can trail recent submissions by that
+long. Ties share a rank.
+"""
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import LeaderboardEntry, User
+from .partitions import ALL_QUIZZES_SQL
+from .progress import PASS_PERCENTAGE, level_percentage
+from .shared import db
+
+BOARDS = ('best_score', 'fewest_attempts', 'weekly')
+ALL_LEVELS = 0
+# Period of the boards that are not weekly.
+ALL_TIME = date(1970, 1, 1)
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+def week_start(moment):
+    """Monday of the week `moment` falls in"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day - timedelta(days=day.weekday())
+
+
+def board_period(board, now=None):
+    return week_start(now or datetime.utcnow()) if board == 'weekly' else ALL_TIME
+
+
+def _global_rows_sql(user_filter):
+    return f"""
+        INSERT INTO leaderboard_entry (user_id, board, level, period, value)
+        SELECT user_id, board, {ALL_LEVELS}, period, sum(value)
+        FROM leaderboard_entry
+        WHERE level <> {ALL_LEVELS} {user_filter}
+          AND (board = 'weekly' AND period = :week OR board <> 'weekly' AND period = :all_time)
+        GROUP BY user_id, board, period
+        HAVING board <> 'fewest_attempts' OR count(*) >= :level_count
+        ON CONFLICT (user_id, board, level, period) DO UPDATE SET value = excluded.value
+        WHERE leaderboard_entry.value <> excluded.value
+    """
+
+
+def record_leaderboard_attempt(user_id, level, score, out_of, attempts, submitted_at, level_count):
+    """Fold one submitted quiz into the user's leaderboard rows.
+
+    attempts is the user's attempt count at the level including this
+    quiz, as returned by record_level_attempt; out_of is what the quiz is
+    graded against, see graded_out_of, and level_count the number of
+    levels in the bank. Runs in the caller's transaction.
+    """
+    if level is None:
+        return
+
+    percentage = level_percentage(score, out_of)
+    week = week_start(submitted_at)
+    rows = [
+        {"user_id": user_id, "board": "best_score", "level": level, "period": ALL_TIME, "value": percentage},
+        {"user_id": user_id, "board": "weekly", "level": level, "period": week, "value": 1},
+    ]
+    if percentage >= PASS_PERCENTAGE:
+        rows.append({"user_id": user_id, "board": "fewest_attempts", "level": level,
+                     "period": ALL_TIME, "value": attempts})
+
+    table = LeaderboardEntry.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.board, table.c.level, table.c.period],
+        set_={"value": case(
+            (table.c.board == 'weekly', table.c.value + stmt.excluded.value),
+            else_=func.greatest(table.c.value, stmt.excluded.value)
+        )},
+        # The first pass is final, and a lower score is no new best.
+        where=(table.c.board == 'weekly')
+        | ((table.c.board == 'best_score') & (stmt.excluded.value > table.c.value))
+    )
+    db.session.execute(stmt)
+    db.session.execute(text(_global_rows_sql("AND user_id = :user_id")), {
+        "user_id": user_id, "week": week, "all_time": ALL_TIME, "level_count": level_count
+    })
+
+
+def backfill_leaderboards(level_count, user_ids=None, now=None):
+    """Rebuild leaderboard_entry from user_level_progress and user_quiz.
+
+    Run after backfill_level_progress. Rebuilds everyone or a list of
+    user_ids; weekly rows of past weeks are dropped. Archived quizzes
+    count towards fewest_attempts. Returns the number of rows written.
+    """
+    params = {"week": week_start(now or datetime.utcnow()), "all_time": ALL_TIME,
+              "level_count": level_count, "pass_percentage": PASS_PERCENTAGE}
+    user_filter = ""
+    if user_ids is not None:
+        user_filter = "AND user_id = ANY(:user_ids)"
+        params["user_ids"] = list(user_ids)
+
+    db.session.execute(text(f"DELETE FROM leaderboard_entry WHERE true {user_filter}"), params)
+    written = db.session.execute(text(f"""
+        INSERT INTO leaderboard_entry (user_id, board, level, period, value)
+        SELECT user_id, 'best_score', level, :all_time, best_percentage
+        FROM user_level_progress
+        WHERE true {user_filter}
+        UNION ALL
+        SELECT user_id, 'fewest_attempts', level, :all_time, min(attempt)
+        FROM (
+            SELECT user_id, level,
+                   row_number() OVER (PARTITION BY user_id, level ORDER BY submitted_at, id) AS attempt,
+                   out_of > 0 AND CAST(coalesce(score, 0) AS float) / out_of * 100 >= :pass_percentage AS passed
+            FROM (
+                SELECT quizzes.*,
+                       coalesce(graded_out_of,
+                                greatest(coalesce(total_questions, 0), coalesce(level_sizes.questions, 0))) AS out_of
+                FROM ({ALL_QUIZZES_SQL}) quizzes
+                LEFT JOIN (SELECT level, count(*) AS questions FROM question GROUP BY level) level_sizes USING (level)
+            ) quizzes
+            WHERE user_id IS NOT NULL AND level IS NOT NULL {user_filter}
+        ) attempts
+        WHERE passed
+        GROUP BY user_id, level
+        UNION ALL
+        SELECT user_id, 'weekly', level, :week, count(*)
+        FROM user_quiz
+        WHERE submitted_at >= :week AND user_id IS NOT NULL AND level IS NOT NULL {user_filter}
+        GROUP BY user_id, level
+    """), params).rowcount
+    written += db.session.execute(text(_global_rows_sql(user_filter)), params).rowcount
+    db.session.commit()
+    return written
+
+
+def _rank_histogram(board, level, period):
+    """(sorted distinct rank keys, running count of users up to each key)"""
+    key = (board, level, period)
+    refresh = current_app.config.get('LEADERBOARD_REFRESH_SECONDS', 30)
+    with _lock:
+        cached = _histograms.get(key)
+        if cached and time.monotonic() - cached[0] < refresh:
+            return cached[1], cached[2]
+
+    # Queried outside the lock so other boards' reads don't wait on it;
+    # threads refreshing the same key at once each store a fresh copy.
+    queried_at = time.monotonic()
+    rows = db.session.execute(text("""
+        SELECT rank_key, count(*) FROM leaderboard_entry
+        WHERE board = :board AND level = :level AND period = :period
+        GROUP BY rank_key ORDER BY rank_key
+    """), {"board": board, "level": level, "period": period}).all()
+    keys = [rank_key for rank_key, _ in rows]
+    running = list(accumulate(users for _, users in rows))
+    with _lock:
+        for stale in [k for k in _histograms if k[0] == board and k[1] == level and k[2] < period]:
+            del _histograms[stale]
+        _histograms[key] = (queried_at, keys, running)
+    return keys, running
+
+
+def _display_value(board, value):
+    return round(value, 1) if board == 'best_score' else int(value)
+
+
+def get_leaderboard(board, level, user_id, limit=10, now=None):
+    """Top `limit` entries of a board plus the caller's own rank"""
+    period = board_period(board, now)
+    entry = LeaderboardEntry
+    rows = db.session.execute(
+        select(entry.user_id, User.username, entry.value, entry.rank_key)
+        .join(User, User.id == entry.user_id)
+        .where(entry.board == board, entry.level == level, entry.period == period)
+        .order_by(entry.rank_key, entry.user_id)
+        .limit(limit)
+    ).all()
+
+    entries = []
+    for position, row in enumerate(rows, 1):
+        rank = entries[-1]["rank"] if entries and row.rank_key == rows[position - 2].rank_key else position
+        entries.append({
+            "rank": rank,
+            "user_id": row.user_id,
+            "username": row.username,
+            "value": _display_value(board, row.value),
+        })
+
+    keys, running = _rank_histogram(board, level, period)
+    me = None
+    mine = db.session.get(entry, (user_id, board, level, period))
+    if mine is not None:
+        better = bisect_left(keys, mine.rank_key)
+        me = {
+            "rank": running[better - 1] + 1 if better else 1,
+            "value": _display_value(board, mine.value),
+        }
+
+    return {
+        "board": board,
+        "level": level,
+        "period": period.isoformat() if board == 'weekly' else None,
+        "total": running[-1] if running else 0,
+        "entries": entries,
+        "me": me,
+    }
@@ -0,0 +1,200 @@
+"""Per-request latency, SQL and response size metrics.
+
+init_app(app) times every request, counts and times the SQL statements
+it runs through SQLAlchemy engine events, and aggregates both into
+histograms keyed by endpoint, method and status. They are served in the
+Prometheus text format at /metrics. Requests slower than
+SLOW_REQUEST_MS are logged together with their slowest statements.
+
+Metrics live in process memory, so with several gunicorn workers each
+scrape only sees the worker that answered it.
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+SLOW_STATEMENTS_LOGGED = 5
+STATEMENT_LOG_LENGTH = 500
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label tuple"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            label_text = ",".join(
+                f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, labels)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("endpoint", "method", "status")
+
+_lock = threading.Lock()
+request_duration = Histogram(
+    "http_request_duration_seconds", "Wall time spent handling the request.", LABELS, DURATION_BUCKETS
+)
+sql_queries = Histogram(
+    "http_request_sql_queries", "SQL statements executed by the request.", LABELS, QUERY_COUNT_BUCKETS
+)
+sql_duration = Histogram(
+    "http_request_sql_duration_seconds", "Time the request spent executing SQL.", LABELS, DURATION_BUCKETS
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Size of the response body.", LABELS, SIZE_BUCKETS
+)
+_histograms = (request_duration, sql_queries, sql_duration, response_size)
+_collectors = []
+
+
+class RequestStats:
+    """SQL activity of the request being handled, kept on flask.g"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest = []
+
+    def add_statement(self, statement, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        entry = (elapsed, self.sql_count, statement)
+        if len(self.slowest) < SLOW_STATEMENTS_LOGGED:
+            heapq.heappush(self.slowest, entry)
+        elif elapsed > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def current_request_stats():
+    """The RequestStats of the current request, or None outside one"""
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request_stats() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    started = conn.info.get('query_started')
+    if stats is None or not started:
+        return
+    stats.add_statement(statement, time.perf_counter() - started.pop())
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+
+    elapsed = time.perf_counter() - stats.started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    if endpoint == '/metrics':
+        return response
+    labels = (endpoint, request.method, str(response.status_code))
+    size = response.calculate_content_length()
+
+    with _lock:
+        request_duration.observe(labels, elapsed)
+        sql_queries.observe(labels, stats.sql_count)
+        sql_duration.observe(labels, stats.sql_time)
+        if size is not None:
+            response_size.observe(labels, size)
+
+    threshold = current_app.config['SLOW_REQUEST_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        _log_slow_request(labels, elapsed, stats)
+    return response
+
+
+def _log_slow_request(labels, elapsed, stats):
+    endpoint, method, status = labels
+    lines = [
+        f"Slow request {method} {endpoint} -> {status}: {elapsed * 1000:.1f} ms, "
+        f"{stats.sql_count} SQL statements in {stats.sql_time * 1000:.1f} ms"
+    ]
+    for statement_elapsed, position, statement in sorted(stats.slowest, reverse=True):
+        statement = " ".join(statement.split())[:STATEMENT_LOG_LENGTH]
+        lines.append(f"  #{position} {statement_elapsed * 1000:.1f} ms: {statement}")
+    logger.warning("\n".join(lines))
+
+
+def add_collector(collector):
+    """Have /metrics also serve the lines collector() returns"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_metrics():
+    lines = []
+    with _lock:
+        for histogram in _histograms:
+            lines.extend(histogram.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response("Forbidden\n", status=403, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics route"""
+    app.config.setdefault('SLOW_REQUEST_MS', 0)
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy import DDL, event
 from src.shared import db
 
 class User(db.Model):
@@ -15,16 +16,114 @@ class Question(db.Model):
     option_c = db.Column(db.Text)
     option_d = db.Column(db.Text)
     correct_option = db.Column(db.String(1))
-    level = db.Column(db.Integer, nullable=False, default=1) 
+    level = db.Column(db.Integer, nullable=False, default=1, index=True) 
 
+# user_quiz and user_quiz_answer are range partitioned by month on
+# submitted_at; see src/partitions.py. Rows outside every monthly
+# partition land in the DEFAULT one.
 class UserQuiz(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     score = db.Column(db.Integer)
-    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    submitted_at = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
+    level = db.Column(db.Integer)
+    total_questions = db.Column(db.Integer)
+    # What the score was graded against, see progress.graded_out_of. NULL
+    # for quizzes stored before it was recorded.
+    graded_out_of = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_user_quiz_user_level_score', 'user_id', 'level', db.desc('score')),
+        db.Index('ix_user_quiz_user_submitted', 'user_id', db.desc('submitted_at'), db.desc('id')),
+        {'postgresql_partition_by': 'RANGE (submitted_at)'},
+    )
 
 class UserQuizAnswer(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_quiz_id = db.Column(db.Integer, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), index=True)
+    selected_option = db.Column(db.Text)
+    selected_index = db.Column(db.SmallInteger)
+    # The quiz's submitted_at, so answers live in the same month's partition.
+    submitted_at = db.Column(db.DateTime, primary_key=True)
+
+    __table_args__ = (
+        db.ForeignKeyConstraint(['user_quiz_id', 'submitted_at'], ['user_quiz.id', 'user_quiz.submitted_at'],
+                                name='user_quiz_answer_user_quiz_fkey'),
+        {'postgresql_partition_by': 'RANGE (submitted_at)'},
+    )
+
+for _table in (UserQuiz.__table__, UserQuizAnswer.__table__):
+    event.listen(_table, 'after_create', DDL(f"CREATE TABLE {_table.name}_default PARTITION OF {_table.name} DEFAULT"))
+
+class UserQuizArchive(db.Model):
+    """Summary rows of quizzes whose partitions were archived"""
+    __tablename__ = 'user_quiz_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    score = db.Column(db.Integer)
+    submitted_at = db.Column(db.DateTime, nullable=False)
+    level = db.Column(db.Integer)
+    total_questions = db.Column(db.Integer)
+    graded_out_of = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_user_quiz_archive_user_submitted', 'user_id', db.desc('submitted_at'), db.desc('id')),
+    )
+
+class UserLevelProgress(db.Model):
+    __tablename__ = 'user_level_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_score = db.Column(db.Integer, nullable=False, default=0)
+    best_percentage = db.Column(db.Float, nullable=False, default=0)
+    last_percentage = db.Column(db.Float, nullable=False, default=0)
+    last_attempt_at = db.Column(db.DateTime)
+    passed = db.Column(db.Boolean, nullable=False, default=False)
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    attempts = db.Column(db.BigInteger, nullable=False, default=0)
+    correct = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_a = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_b = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_c = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_d = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_other = db.Column(db.BigInteger, nullable=False, default=0)
+
+class QuestionStatsArchive(db.Model):
+    """question_stats counts of the answers in archived partitions"""
+    __tablename__ = 'question_stats_archive'
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    attempts = db.Column(db.BigInteger, nullable=False, default=0)
+    correct = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_a = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_b = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_c = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_d = db.Column(db.BigInteger, nullable=False, default=0)
+    picked_other = db.Column(db.BigInteger, nullable=False, default=0)
+
+class QuestionBankMeta(db.Model):
+    __tablename__ = 'question_bank_meta'
     id = db.Column(db.Integer, primary_key=True)
-    user_quiz_id = db.Column(db.Integer, db.ForeignKey('user_quiz.id'))
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
-    selected_option = db.Column(db.Text)
\ No newline at end of file
+    version = db.Column(db.BigInteger, nullable=False, default=1)
+
+class LeaderboardEntry(db.Model):
+    __tablename__ = 'leaderboard_entry'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    board = db.Column(db.String(20), primary_key=True)
+    level = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+    rank_key = db.Column(
+        db.Float,
+        db.Computed("CASE WHEN board = 'fewest_attempts' THEN value ELSE -value END", persisted=True),
+        nullable=False
+    )
+
+    __table_args__ = (
+        db.Index('ix_leaderboard_entry_rank', 'board', 'level', 'period', 'rank_key', 'user_id'),
+    )
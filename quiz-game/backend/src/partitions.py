@@ -0,0 +1,261 @@
+"""Monthly partitions of user_quiz and user_quiz_answer, and their archival.
+
+Both tables are range partitioned on submitted_at, one partition per
+calendar month named like user_quiz_p2025_01, plus a DEFAULT partition
+that catches rows no monthly partition covers. Answers carry their
+quiz's submitted_at, so a quiz and its answers always share a month.
+
+create_month_partitions adds the partitions of a month. A new partition
+is filled from the DEFAULT partition if rows for its month ended up
+there, and then attached, which avoids locking the parent table for
+longer than the attach itself.
+
+archive_month exports both partitions of a month as gzipped CSV with a
+JSON manifest, keeps a summary row per quiz in user_quiz_archive and the
+answers' question_stats counts in question_stats_archive, then detaches
+the partitions. History, the level ledger and the backfills read the
+archived summaries through quiz_summaries(). Archived answers are only
+in the exported files, so regrade can't reach them.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime
+
+from sqlalchemy import false, select, text, true, union_all
+
+from .models import UserQuiz, UserQuizArchive
+from .shared import db
+
+PARTITIONED_TABLES = ('user_quiz', 'user_quiz_answer')
+ARCHIVE_LOCK_TIMEOUT = '10s'
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Every quiz, hot or archived, as plain SQL for the raw-SQL backfills.
+ALL_QUIZZES_SQL = """
+    SELECT id, user_id, score, submitted_at, level, total_questions, graded_out_of FROM user_quiz
+    UNION ALL
+    SELECT id, user_id, score, submitted_at, level, total_questions, graded_out_of FROM user_quiz_archive
+"""
+
+# question_stats counts of a set of answers, graded the way
+# QuestionBank.is_correct grades them.
+ANSWER_COUNTS_SQL = """
+    SELECT a.question_id,
+           count(*) AS attempts,
+           count(*) FILTER (WHERE
+               a.selected_index = strpos('ABCD', upper(q.correct_option)) - 1
+               OR (a.selected_index IS NULL AND a.selected_option =
+                   CASE WHEN strpos('ABCD', upper(coalesce(q.correct_option, ''))) > 0
+                        THEN (ARRAY[q.option_a, q.option_b, q.option_c, q.option_d])
+                                 [strpos('ABCD', upper(q.correct_option))]
+                        ELSE ''
+                   END)) AS correct,
+           count(*) FILTER (WHERE a.selected_index = 0) AS picked_a,
+           count(*) FILTER (WHERE a.selected_index = 1) AS picked_b,
+           count(*) FILTER (WHERE a.selected_index = 2) AS picked_c,
+           count(*) FILTER (WHERE a.selected_index = 3) AS picked_d,
+           count(*) FILTER (WHERE a.selected_index IS NULL) AS picked_other
+    FROM {answers} a
+    JOIN question q ON q.id = a.question_id
+    {where}
+    GROUP BY a.question_id
+"""
+
+
+def quiz_summaries():
+    """user_quiz and user_quiz_archive as one subquery, with an `archived` flag"""
+    columns = ('id', 'user_id', 'score', 'submitted_at', 'level', 'total_questions', 'graded_out_of')
+    hot = select(*(UserQuiz.__table__.c[name] for name in columns), false().label('archived'))
+    cold = select(*(UserQuizArchive.__table__.c[name] for name in columns), true().label('archived'))
+    return union_all(hot, cold).subquery('quizzes')
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def list_partitions(table):
+    """Partitions attached to table: dicts of name, month (None for DEFAULT) and rows estimate"""
+    rows = db.session.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+        ORDER BY c.relname
+    """), {"table": table}).all()
+    partitions = []
+    for name, bound, estimate in rows:
+        match = _BOUND.search(bound)
+        month = datetime.fromisoformat(match.group(1)).date() if match else None
+        partitions.append({"name": name, "month": month, "rows_estimate": max(int(estimate), 0)})
+    return partitions
+
+
+def _attached(table):
+    return {partition["name"] for partition in list_partitions(table)}
+
+
+def create_month_partitions(month):
+    """Create and attach both tables' partitions for month. Returns the names created.
+
+    Rows the DEFAULT partitions hold for the month are moved in first.
+    Answers move before their quizzes, so no quiz row is deleted while
+    answers still reference it, and quizzes are attached before answers,
+    so the answers' foreign key finds them. Commits.
+    """
+    low, high = month.isoformat(), add_months(month, 1).isoformat()
+    missing = [table for table in PARTITIONED_TABLES if partition_name(table, month) not in _attached(table)]
+    for table in reversed(missing):
+        name = partition_name(table, month)
+        db.session.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        db.session.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE submitted_at >= :low AND submitted_at < :high RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {"low": low, "high": high})
+    for table in missing:
+        name = partition_name(table, month)
+        db.session.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{low}') TO ('{high}')"))
+    db.session.commit()
+    return [partition_name(table, month) for table in missing]
+
+
+def ensure_future_partitions(months_ahead, today=None):
+    """Make sure this month and the next months_ahead months have partitions"""
+    first = month_start(today or datetime.utcnow().date())
+    created = []
+    for offset in range(months_ahead + 1):
+        created.extend(create_month_partitions(add_months(first, offset)))
+    return created
+
+
+def default_months():
+    """Months that have rows in the DEFAULT partition, oldest first"""
+    return db.session.execute(text("""
+        SELECT DISTINCT CAST(date_trunc('month', submitted_at) AS date) FROM user_quiz_default ORDER BY 1
+    """)).scalars().all()
+
+
+def archivable_months(before):
+    """Months with attached partitions that end on or before `before`, oldest first"""
+    months = {partition["month"] for partition in list_partitions('user_quiz') if partition["month"]}
+    return sorted(month for month in months if add_months(month, 1) <= before)
+
+
+def _copy_to_gzip(cursor, query, path):
+    """COPY query's rows as CSV into path.gz. Returns (rows, sha256)."""
+    partial = path + ".partial"
+    with gzip.open(partial, 'wb') as target:
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", target)
+        rows = cursor.rowcount
+    digest = hashlib.sha256()
+    with open(partial, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    os.replace(partial, path)
+    return rows, digest.hexdigest()
+
+
+def _column_types(table):
+    return db.session.execute(text("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = CAST(:table AS regclass) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """), {"table": table}).all()
+
+
+def archive_month(month, archive_dir, drop=False):
+    """Export, summarize and detach both partitions of month. Commits.
+
+    Files go to archive_dir as <partition>.csv.gz, one row per line with
+    a header, plus <month>.json describing columns, row counts and
+    checksums. With drop the detached tables are dropped, otherwise they
+    are left as plain tables without the foreign key.
+    """
+    quiz_partition = partition_name('user_quiz', month)
+    answer_partition = partition_name('user_quiz_answer', month)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    # Writers to these two partitions wait until the month is archived;
+    # the rest of the tables stays writable until the detach.
+    db.session.execute(text(f"SET LOCAL lock_timeout = '{ARCHIVE_LOCK_TIMEOUT}'"))
+    db.session.execute(text(f"LOCK TABLE {quiz_partition}, {answer_partition} IN SHARE MODE"))
+
+    manifest = {"month": month.isoformat()[:7], "archived_at": datetime.utcnow().isoformat(timespec='seconds'),
+                "tables": {}}
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        for table, partition in (('user_quiz', quiz_partition), ('user_quiz_answer', answer_partition)):
+            filename = f"{partition}.csv.gz"
+            rows, checksum = _copy_to_gzip(
+                cursor, f"SELECT * FROM {partition} ORDER BY id", os.path.join(archive_dir, filename)
+            )
+            manifest["tables"][table] = {
+                "file": filename,
+                "rows": rows,
+                "sha256": checksum,
+                "columns": [{"name": name, "type": type_name} for name, type_name in _column_types(partition)],
+            }
+    finally:
+        cursor.close()
+
+    summaries = db.session.execute(text(f"""
+        INSERT INTO user_quiz_archive (id, user_id, score, submitted_at, level, total_questions, graded_out_of)
+        SELECT id, user_id, score, submitted_at, level, total_questions, graded_out_of FROM {quiz_partition}
+        ON CONFLICT (id) DO NOTHING
+    """)).rowcount
+    db.session.execute(text(f"""
+        INSERT INTO question_stats_archive
+            (question_id, attempts, correct, picked_a, picked_b, picked_c, picked_d, picked_other)
+        {ANSWER_COUNTS_SQL.format(answers=answer_partition, where='')}
+        ON CONFLICT (question_id) DO UPDATE SET
+            attempts = question_stats_archive.attempts + excluded.attempts,
+            correct = question_stats_archive.correct + excluded.correct,
+            picked_a = question_stats_archive.picked_a + excluded.picked_a,
+            picked_b = question_stats_archive.picked_b + excluded.picked_b,
+            picked_c = question_stats_archive.picked_c + excluded.picked_c,
+            picked_d = question_stats_archive.picked_d + excluded.picked_d,
+            picked_other = question_stats_archive.picked_other + excluded.picked_other
+    """))
+
+    # Answers first: a detached answer table keeps its foreign key to
+    # user_quiz, which would stop the quiz partition from detaching.
+    db.session.execute(text(f"ALTER TABLE user_quiz_answer DETACH PARTITION {answer_partition}"))
+    foreign_keys = db.session.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = CAST(:table AS regclass) AND contype = 'f' AND confrelid = CAST('user_quiz' AS regclass)
+    """), {"table": answer_partition}).scalars().all()
+    for constraint in foreign_keys:
+        db.session.execute(text(f'ALTER TABLE {answer_partition} DROP CONSTRAINT "{constraint}"'))
+    db.session.execute(text(f"ALTER TABLE user_quiz DETACH PARTITION {quiz_partition}"))
+    if drop:
+        db.session.execute(text(f"DROP TABLE {answer_partition}, {quiz_partition}"))
+
+    manifest_path = os.path.join(archive_dir, f"{manifest['month']}.json")
+    with open(manifest_path + ".partial", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".partial", manifest_path)
+    db.session.commit()
+
+    return {
+        "month": manifest["month"],
+        "quizzes": manifest["tables"]["user_quiz"]["rows"],
+        "answers": manifest["tables"]["user_quiz_answer"]["rows"],
+        "summaries": summaries,
+        "manifest": manifest_path,
+        "dropped": drop,
+    }
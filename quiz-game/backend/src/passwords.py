@@ -0,0 +1,163 @@
+"""Password hashing on a bounded process pool.
+
+Hashes are deliberately slow, so /login and /register hand them to a
+small per-worker process pool instead of hashing on the request thread.
+At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE hashes may be in
+flight per worker; past that, HashingBusy is raised and the request is
+answered with 503 and Retry-After instead of queueing behind the
+others. PASSWORD_HASH_WORKERS=0 hashes inline.
+
+PASSWORD_HASH_METHOD is passed to werkzeug's generate_password_hash, so
+changing it changes the cost of new hashes. Existing hashes made with a
+different method are replaced on the next successful login.
+"""
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already in flight"""
+
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_slots = None
+_method_prefixes = {}
+
+
+def _mp_context():
+    # Workers run threads (request threads, the answer writer), and a
+    # child forked from them could inherit a lock some other thread held.
+    # The forkserver is started once from a clean interpreter that has
+    # only imported the hash functions, and forks each child from there.
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['werkzeug.security'])
+    return context
+
+
+def _get_pool():
+    """This process's pool and admission semaphore, created on first use.
+
+    Created lazily so every gunicorn worker gets its own after the fork.
+    """
+    global _pool, _pool_pid, _slots
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            workers = current_app.config['PASSWORD_HASH_WORKERS']
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context())
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(workers + current_app.config['PASSWORD_HASH_QUEUE'])
+        return _pool, _slots
+
+
+def _reset_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if not current_app.config['PASSWORD_HASH_WORKERS']:
+        return fn(*args)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException as e:
+        slots.release()
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool(pool)
+        raise
+    # The slot stays taken until the hash is done, also when the request
+    # gives up waiting for it below.
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+    except TimeoutError:
+        raise HashingBusy()
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def _configured_prefix():
+    """The 'method:params' prefix hashes made with the current setting start with"""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _configured_prefix()
+
+
+def try_rehash(user, password):
+    """Rehash user's password with the current method when there is room.
+
+    Returns True if the hash was replaced. The caller commits.
+    """
+    if not needs_rehash(user.password_hash):
+        return False
+    try:
+        user.password_hash = hash_password(password)
+    except HashingBusy:
+        return False
+    return True
+
+
+def init_app(app):
+    """Fill in hashing defaults and answer HashingBusy with 503"""
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    app.config.setdefault('PASSWORD_HASH_QUEUE', 8)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+    app.config.setdefault('PASSWORD_HASH_RETRY_AFTER', 1)
+    app.config.setdefault('PASSWORD_BULK_WORKERS', None)
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(error):
+        return (
+            jsonify({'message': 'Server is busy, please try again shortly'}),
+            503,
+            {'Retry-After': str(app.config['PASSWORD_HASH_RETRY_AFTER'])}
+        )
+
+
+@contextmanager
+def bulk_hasher(workers=None):
+    """Yield a function that hashes a list of passwords across all cores.
+
+    For bulk jobs only: it uses its own pool, so it never takes slots
+    from /login and /register.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as pool:
+        def hash_batch(passwords):
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(pool.map(generate_password_hash, passwords, repeat(method), chunksize=chunksize))
+        yield hash_batch
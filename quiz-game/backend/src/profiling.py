@@ -0,0 +1,145 @@
+"""Opt-in cProfile sampling of live requests.
+
+A request is profiled when PROFILE_SAMPLE_RATE picks it, or when it
+carries an X-Profile-Token header that matches PROFILE_TOKEN together
+with the JWT of a user listed in ADMIN_USER_IDS. Each profile is written
+to PROFILE_DIR as a pstats file, with a JSON file next to it that
+records the endpoint, user id, status, duration and SQL count. Only the
+newest PROFILE_KEEP profiles are kept.
+
+When both the sample rate and the token are unset, init_app installs
+nothing at all.
+"""
+import cProfile
+import hmac
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from .auth import is_admin
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+_sequence = itertools.count()
+
+
+def _should_profile():
+    config = current_app.config
+    token = config['PROFILE_TOKEN']
+    supplied = request.headers.get(PROFILE_HEADER)
+    if token and supplied is not None:
+        return hmac.compare_digest(supplied.encode(), token.encode()) and _caller_is_admin()
+    rate = config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _caller_is_admin():
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return False
+    return is_admin(get_jwt_identity())
+
+
+def _current_user_id():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _start_profile():
+    if not _should_profile():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler already owns this thread.
+        return
+    g.profile = (profiler, time.perf_counter())
+
+
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profiler, started = profile
+    profiler.disable()
+
+    stats = g.get('request_stats')
+    meta = {
+        'endpoint': request.url_rule.rule if request.url_rule else None,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': response.status_code,
+        'user_id': _current_user_id(),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+        'sql_count': stats.sql_count if stats else None,
+        'sql_ms': round(stats.sql_time * 1000, 3) if stats else None,
+        'recorded_at': datetime.utcnow().isoformat(),
+    }
+    try:
+        write_profile(current_app.config['PROFILE_DIR'], current_app.config['PROFILE_KEEP'], profiler, meta)
+    except OSError as e:
+        logging.error(f"Error writing request profile: {str(e)}")
+    return response
+
+
+def write_profile(directory, keep, profiler, meta):
+    """Write one profile and drop the oldest beyond keep"""
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{next(_sequence)}"
+    path = os.path.join(directory, stem)
+    profiler.dump_stats(path + '.prof')
+    with open(path + '.json', 'w') as f:
+        json.dump(meta, f)
+
+    stems = sorted(name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json'))
+    for old in stems[:-keep] if keep > 0 else []:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, old + suffix))
+            except FileNotFoundError:
+                pass
+    return path + '.prof'
+
+
+def list_profiles(directory):
+    """Metadata of the stored profiles, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        stem = name[:-len('.json')]
+        try:
+            with open(os.path.join(directory, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['profile'] = os.path.join(directory, stem + '.prof')
+        profiles.append(meta)
+    return profiles
+
+
+def init_app(app):
+    """Install the profiling hooks if profiling is configured"""
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0)
+    app.config.setdefault('PROFILE_TOKEN', None)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+    app.config.setdefault('PROFILE_KEEP', 200)
+    if not app.config['PROFILE_SAMPLE_RATE'] and not app.config['PROFILE_TOKEN']:
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
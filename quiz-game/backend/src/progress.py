@@ -0,0 +1,143 @@
+from sqlalchemy import Float, case, cast, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+
+from .models import Question, UserLevelProgress
+from .partitions import quiz_summaries
+from .question_bank import get_question_bank
+from .shared import db
+
+PASS_PERCENTAGE = 80
+
+
+def get_level_question_counts():
+    """Return {level: number of questions} for every level in the bank"""
+    return get_question_bank().level_counts
+
+
+def get_user_level_progress(user_id):
+    """Return {level: UserLevelProgress} for one user"""
+    rows = UserLevelProgress.query.filter_by(user_id=user_id).all()
+    return {row.level: row for row in rows}
+
+
+def graded_out_of(total_questions, level_questions, attempt_questions=None):
+    """How many questions a quiz is graded out of.
+
+    A quiz taken with an attempt token counts against the questions the
+    token signed. Without one it counts against the whole level, or
+    against its own length if the level has since shrunk, so a short
+    hand-picked submission can't pass a level.
+    """
+    if attempt_questions:
+        return attempt_questions
+    return max(total_questions, level_questions or 0)
+
+
+def level_percentage(score, out_of):
+    """Score as a percentage of out_of, see graded_out_of"""
+    return (score / out_of) * 100 if out_of > 0 else 0
+
+
+def record_level_attempt(user_id, level, score, out_of, submitted_at, expected_attempts=None):
+    """Fold one submitted quiz into the user's level ledger.
+
+    out_of is what the quiz is graded against, see graded_out_of. Runs in the caller's transaction, so the ledger
+    commits together with the quiz it describes. With expected_attempts
+    the row is only updated if the user still has exactly that many
+    attempts at the level. Returns the user's attempt count at the level
+    including this one, 0 for a quiz without a level (nothing to
+    record), or None when the row was not updated, i.e. the attempt was
+    already submitted.
+    """
+    if level is None:
+        return 0
+
+    percentage = level_percentage(score, out_of)
+    passed = percentage >= PASS_PERCENTAGE
+    table = UserLevelProgress.__table__
+
+    stmt = insert(table).values(
+        user_id=user_id,
+        level=level,
+        best_score=score,
+        attempts=1,
+        last_score=score,
+        best_percentage=percentage,
+        last_percentage=percentage,
+        last_attempt_at=submitted_at,
+        passed=passed
+    )
+    is_newer = stmt.excluded.last_attempt_at >= func.coalesce(table.c.last_attempt_at, stmt.excluded.last_attempt_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.level],
+        set_={
+            "best_score": func.greatest(table.c.best_score, stmt.excluded.best_score),
+            "attempts": table.c.attempts + 1,
+            "last_score": case((is_newer, stmt.excluded.last_score), else_=table.c.last_score),
+            "best_percentage": func.greatest(table.c.best_percentage, stmt.excluded.best_percentage),
+            "last_percentage": case((is_newer, stmt.excluded.last_percentage), else_=table.c.last_percentage),
+            "last_attempt_at": func.greatest(table.c.last_attempt_at, stmt.excluded.last_attempt_at),
+            "passed": table.c.passed | stmt.excluded.passed,
+        },
+        where=(table.c.attempts == expected_attempts) if expected_attempts is not None else None
+    ).returning(table.c.attempts)
+    return db.session.execute(stmt).scalar()
+
+
+def backfill_level_progress(user_id=None, user_ids=None):
+    """Rebuild the level ledger from user_quiz history, archived quizzes included.
+
+    Rebuilds everyone, one user_id, or a list of user_ids. Reads the
+    denormalized user_quiz.level/score columns and grades each quiz out
+    of its graded_out_of; quizzes stored before that column existed are
+    graded like a submit without an attempt token, against the level's
+    current size. Returns the number of ledger rows written.
+    """
+    quizzes = quiz_summaries()
+    quiz = quizzes.c
+    level_sizes = select(Question.level, func.count().label('questions'))\
+        .group_by(Question.level).subquery('level_sizes')
+    out_of = func.coalesce(
+        quiz.graded_out_of,
+        func.greatest(func.coalesce(quiz.total_questions, 0), func.coalesce(level_sizes.c.questions, 0))
+    )
+    score = func.coalesce(quiz.score, 0)
+    percentage = case(
+        (out_of > 0, cast(score, Float) / out_of * 100),
+        else_=0.0
+    )
+    newest_first = (quiz.submitted_at.desc(), quiz.id.desc())
+    ledger = select(
+            quiz.user_id,
+            quiz.level,
+            func.max(score),
+            func.count(),
+            func.array_agg(aggregate_order_by(score, *newest_first))[1],
+            func.max(percentage),
+            func.array_agg(aggregate_order_by(percentage, *newest_first))[1],
+            func.max(quiz.submitted_at),
+            func.bool_or(percentage >= PASS_PERCENTAGE))\
+        .select_from(quizzes)\
+        .outerjoin(level_sizes, level_sizes.c.level == quiz.level)\
+        .where(quiz.user_id.isnot(None))\
+        .where(quiz.level.isnot(None))\
+        .group_by(quiz.user_id, quiz.level)
+    table = UserLevelProgress.__table__
+    delete = table.delete()
+    if user_id is not None:
+        ledger = ledger.where(quiz.user_id == user_id)
+        delete = delete.where(table.c.user_id == user_id)
+    if user_ids is not None:
+        ledger = ledger.where(quiz.user_id.in_(user_ids))
+        delete = delete.where(table.c.user_id.in_(user_ids))
+    db.session.execute(delete)
+
+    result = db.session.execute(
+        insert(table).from_select(
+            ["user_id", "level", "best_score", "attempts", "last_score",
+             "best_percentage", "last_percentage", "last_attempt_at", "passed"],
+            ledger
+        )
+    )
+    db.session.commit()
+    return result.rowcount
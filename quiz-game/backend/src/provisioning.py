@@ -0,0 +1,138 @@
+import csv
+import json
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import User
+from .shared import db
+
+IMPORT_BATCH_SIZE = 1000
+USERNAME_MAX_LENGTH = User.__table__.c.username.type.length
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file can't be read as the requested format"""
+
+
+def detect_format(name):
+    """'csv' or 'ndjson' from a file name or content type, else None"""
+    name = (name or '').lower()
+    if 'csv' in name:
+        return 'csv'
+    if any(marker in name for marker in ('ndjson', 'jsonl', 'json')):
+        return 'ndjson'
+    return None
+
+
+def read_user_rows(stream, fmt):
+    """Yield {row, username, password} dicts from a CSV or NDJSON text stream.
+
+    Rows that can't be parsed carry an 'error' instead.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames or not {'username', 'password'} <= set(reader.fieldnames):
+            raise ImportFormatError("CSV must have a header with username and password columns")
+        for number, row in enumerate(reader, 1):
+            yield {'row': number, 'username': row.get('username'), 'password': row.get('password')}
+    elif fmt == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield {'row': number, 'username': None, 'password': None, 'error': "Invalid JSON"}
+                continue
+            if not isinstance(row, dict):
+                yield {'row': number, 'username': None, 'password': None, 'error': "Expected a JSON object"}
+                continue
+            yield {'row': number, 'username': row.get('username'), 'password': row.get('password')}
+    else:
+        raise ImportFormatError("Format must be csv or ndjson")
+
+
+def _validate(row):
+    if row.get('error'):
+        return row['error']
+    username, password = row['username'], row['password']
+    if not isinstance(username, str) or not username:
+        return "Missing username"
+    if len(username) > USERNAME_MAX_LENGTH:
+        return f"Username is longer than {USERNAME_MAX_LENGTH} characters"
+    if not isinstance(password, str) or not password:
+        return "Missing password"
+    return None
+
+
+def _insert_batch(batch, hash_batch):
+    """Create the users in batch that don't exist yet and return their results"""
+    usernames = [row['username'] for row in batch]
+    existing = set(db.session.execute(
+        select(User.username).where(User.username.in_(usernames))
+    ).scalars())
+
+    new_rows = [row for row in batch if row['username'] not in existing]
+    created = {}
+    if new_rows:
+        hashes = hash_batch([row['password'] for row in new_rows])
+        created = {
+            username: user_id
+            for user_id, username in db.session.execute(
+                insert(User)
+                .values([
+                    {'username': row['username'], 'password_hash': password_hash}
+                    for row, password_hash in zip(new_rows, hashes)
+                ])
+                .on_conflict_do_nothing(index_elements=[User.username])
+                .returning(User.id, User.username)
+            )
+        }
+
+    results = []
+    for row in batch:
+        result = {'row': row['row'], 'username': row['username']}
+        if row['username'] in created:
+            result.update(status='created', user_id=created[row['username']])
+        else:
+            result['status'] = 'exists'
+        results.append(result)
+    return results
+
+
+def import_users(rows, hash_batch, batch_size=IMPORT_BATCH_SIZE):
+    """Create users from read_user_rows output and return one result per row.
+
+    Every batch costs one lookup for existing usernames and one INSERT
+    ... ON CONFLICT DO NOTHING. A username already taken, or one that
+    appears earlier in the same file, is reported and skipped. Nothing
+    is committed; the caller commits once so the import is atomic.
+    """
+    results = []
+    seen = set()
+    batch = []
+    for row in rows:
+        error = _validate(row)
+        if error:
+            results.append({'row': row['row'], 'username': row.get('username'), 'status': 'invalid', 'error': error})
+        elif row['username'] in seen:
+            results.append({'row': row['row'], 'username': row['username'], 'status': 'duplicate'})
+        else:
+            seen.add(row['username'])
+            batch.append(row)
+            if len(batch) >= batch_size:
+                results.extend(_insert_batch(batch, hash_batch))
+                batch = []
+    if batch:
+        results.extend(_insert_batch(batch, hash_batch))
+
+    results.sort(key=lambda result: result['row'])
+    return results
+
+
+def summarize_results(results):
+    summary = {'created': 0, 'exists': 0, 'duplicate': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
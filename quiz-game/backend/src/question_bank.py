@@ -0,0 +1,279 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+from flask import current_app, request
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import Question, QuestionBankMeta
+from .shared import db
+
+
+OPTION_LETTERS = 'ABCD'
+
+
+def get_option_text_by_letter(question, letter):
+    """Convert option letter (A, B, C, D) to actual option text"""
+    option_map = {
+        'A': question.option_a,
+        'B': question.option_b,
+        'C': question.option_c,
+        'D': question.option_d
+    }
+    return option_map.get(letter.upper(), '')
+
+
+def encode_json(obj):
+    """Serialize obj the same way jsonify orders it, as compact bytes"""
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True).encode()
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()[:24]
+
+
+def json_payload_response(body, etag):
+    """Return pre-encoded JSON with a strong ETag, or a bodyless 304 if it matches"""
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+class QuestionBank:
+    """Immutable snapshot of the question table at one bank version"""
+
+    def __init__(self, version, questions):
+        self.version = version
+        self.questions = {}
+        self.correct_options = {}
+        self.correct_indexes = {}
+        self.level_ids = {}
+
+        for question in questions:
+            self.questions[question.id] = {
+                "id": question.id,
+                "question": question.question_text,
+                "options": [
+                    question.option_a,
+                    question.option_b,
+                    question.option_c,
+                    question.option_d
+                ],
+                "answer": get_option_text_by_letter(question, question.correct_option or ''),
+                "level": question.level
+            }
+            self.correct_options[question.id] = question.correct_option
+            correct_index = OPTION_LETTERS.find((question.correct_option or '').upper())
+            self.correct_indexes[question.id] = correct_index if correct_index >= 0 else None
+            self.level_ids.setdefault(question.level, []).append(question.id)
+
+        for ids in self.level_ids.values():
+            ids.sort()
+        self.level_counts = {level: len(ids) for level, ids in self.level_ids.items()}
+        self.ordered_ids = [qid for level in sorted(self.level_ids) for qid in self.level_ids[level]]
+        self._payloads = {}
+        self._encoded = {}
+
+    def get(self, question_id):
+        return self.questions.get(question_id)
+
+    def resolve_answer(self, question_id, selected):
+        """Map a submitted answer to (option index, leftover text).
+
+        Accepts the option text, its letter (A-D) or its 0-3 index. Only
+        answers that match no option keep their text.
+        """
+        options = self.questions[question_id]["options"]
+
+        if isinstance(selected, int) and not isinstance(selected, bool):
+            if 0 <= selected < len(options):
+                return selected, None
+            return None, str(selected)
+        if not isinstance(selected, str):
+            return None, selected
+
+        correct_index = self.correct_indexes[question_id]
+        if correct_index is not None and selected == options[correct_index]:
+            return correct_index, None
+        if selected in options:
+            return options.index(selected), None
+        if len(selected) == 1 and selected.upper() in OPTION_LETTERS:
+            return OPTION_LETTERS.index(selected.upper()), None
+        return None, selected
+
+    def answer_text(self, question_id, selected_index, selected_option):
+        """Text shown to clients for a stored answer"""
+        if selected_index is None:
+            return selected_option
+        return self.questions[question_id]["options"][selected_index]
+
+    def is_correct(self, question_id, selected_index, selected_option):
+        if selected_index is not None:
+            return selected_index == self.correct_indexes[question_id]
+        return selected_option == self.questions[question_id]["answer"]
+
+    def level_questions(self, level):
+        return [self.questions[qid] for qid in self.level_ids.get(level, [])]
+
+    def all_questions(self):
+        return [self.questions[qid] for qid in self.ordered_ids]
+
+    def attempt_question_ids(self, level, seed=None, count=None):
+        """Ids of one attempt: the whole level, or `count` of them drawn with `seed`.
+
+        Sampling only touches `count` positions of the precomputed id
+        list, so it costs the same however large the level is.
+        """
+        ids = self.level_ids.get(level, [])
+        if count is None or count >= len(ids):
+            return ids
+        return sorted(random.Random(seed).sample(ids, count))
+
+    def questions_payload(self, question_ids):
+        """JSON bytes of a question list, joined from cached per-question encodings"""
+        parts = []
+        for qid in question_ids:
+            encoded = self._encoded.get(qid)
+            if encoded is None:
+                encoded = self._encoded[qid] = encode_json(self.questions[qid])
+            parts.append(encoded)
+        return b"[" + b",".join(parts) + b"]"
+
+    def level_payload(self, level):
+        """(JSON bytes of the level's question list, ETag), encoded once per snapshot"""
+        payload = self._payloads.get(level)
+        if payload is None:
+            body = self.questions_payload(self.level_ids.get(level, []))
+            payload = self._payloads[level] = (body, make_etag(body))
+        return payload
+
+    def all_payload(self):
+        """(JSON bytes of the /api/all-questions body, ETag), encoded once per snapshot"""
+        payload = self._payloads.get("all")
+        if payload is None:
+            body = encode_json({
+                "questions": self.all_questions(),
+                "total_questions": len(self.ordered_ids)
+            })
+            payload = self._payloads["all"] = (body, make_etag(body))
+        return payload
+
+
+_lock = threading.Lock()
+_state = {
+    "bank": None,
+    "checked_at": 0.0,
+}
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "version_checks": 0,
+    "reloads": 0,
+}
+
+
+def read_bank_version():
+    """Read the shared bank version that every question write bumps"""
+    version = db.session.query(QuestionBankMeta.version).filter_by(id=1).scalar()
+    return version or 0
+
+
+def bump_bank_version():
+    """Bump the shared bank version inside the caller's transaction.
+
+    Every worker compares its cached snapshot against this number, so
+    any code that writes to the question table must call this before it
+    commits. The local snapshot is dropped straight away.
+    """
+    table = QuestionBankMeta.__table__
+    stmt = insert(table).values(id=1, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={"version": table.c.version + 1}
+    ).returning(table.c.version)
+    version = db.session.execute(stmt).scalar_one()
+    invalidate_question_bank()
+    return version
+
+
+def invalidate_question_bank():
+    with _lock:
+        _state["bank"] = None
+        _state["checked_at"] = 0.0
+
+
+def cached_question_bank(version=None):
+    """Return the cached bank without touching the database, or None.
+
+    Without version the bank counts only inside its
+    QUESTION_BANK_VERSION_TTL; with version, only if it is at that
+    version or newer, which also restarts the TTL. Newer counts so that a
+    version read from a lagging replica doesn't reload an older bank.
+    Callers that read the version some other way, like the async API,
+    share the cache through this.
+    """
+    ttl = current_app.config.get("QUESTION_BANK_VERSION_TTL", 0)
+    now = time.monotonic()
+
+    with _lock:
+        bank = _state["bank"]
+        if version is None:
+            if bank is not None and now - _state["checked_at"] < ttl:
+                stats["hits"] += 1
+                return bank
+            return None
+
+        stats["version_checks"] += 1
+        if bank is not None and bank.version >= version:
+            _state["checked_at"] = now
+            stats["hits"] += 1
+            return bank
+        stats["misses"] += 1
+        return None
+
+
+def get_question_bank(min_version=None):
+    """Return the cached question bank, reloading it if the version moved.
+
+    The version row is re-read at most once every
+    QUESTION_BANK_VERSION_TTL seconds (0 means on every call), or right
+    away if the cached bank is older than min_version.
+    """
+    bank = cached_question_bank()
+    if bank is not None and (min_version is None or bank.version >= min_version):
+        return bank
+
+    version = read_bank_version()
+    bank = cached_question_bank(version)
+    if bank is not None:
+        return bank
+
+    now = time.monotonic()
+    questions = db.session.query(
+            Question.id, Question.question_text, Question.option_a, Question.option_b,
+            Question.option_c, Question.option_d, Question.correct_option, Question.level)\
+        .all()
+    bank = QuestionBank(version, questions)
+
+    with _lock:
+        _state["bank"] = bank
+        _state["checked_at"] = now
+        stats["reloads"] += 1
+    return bank
+
+
+def get_question_bank_stats():
+    with _lock:
+        bank = _state["bank"]
+        return {
+            **stats,
+            "version": bank.version if bank else None,
+            "questions": len(bank.questions) if bank else 0,
+            "level_counts": dict(bank.level_counts) if bank else {},
+        }
@@ -0,0 +1,275 @@
+"""Bulk import and export of the question bank through Postgres COPY.
+
+Imports are streamed with COPY into a temporary staging table, then
+validated and merged into `question` with set-based statements, so memory
+stays flat however large the file is. Questions are matched on their
+text: a matching question is updated in place, anything else is
+inserted. The bank version is bumped once per import.
+"""
+import csv
+import io
+import json
+import queue
+import threading
+
+from sqlalchemy import text
+
+from .question_bank import bump_bank_version
+from .question_levels import VALID_LEVELS
+from .shared import db
+
+QUESTION_COLUMNS = (
+    'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option', 'level'
+)
+# An id column is accepted so exported files can be re-imported; it is ignored.
+IMPORT_COLUMNS = ('id',) + QUESTION_COLUMNS
+INVALID_ROWS_REPORTED = 100
+EXPORT_QUEUE_CHUNKS = 16
+
+
+class QuestionImportError(ValueError):
+    """The file can't be imported; invalid_rows lists the offending rows"""
+
+    def __init__(self, message, invalid_rows=None):
+        super().__init__(message)
+        self.message = message
+        self.invalid_rows = invalid_rows or []
+
+
+class _LineReader(io.TextIOBase):
+    """Read-only text stream over an iterator of lines, for COPY FROM STDIN"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def _ndjson_as_csv(stream):
+    """Re-encode NDJSON question objects as CSV lines in QUESTION_COLUMNS order"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise QuestionImportError(f"Line {number} is not valid JSON")
+        if not isinstance(row, dict):
+            raise QuestionImportError(f"Line {number} is not a JSON object")
+        writer.writerow([row.get(column) for column in QUESTION_COLUMNS])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+def _csv_columns(stream):
+    """Read the CSV header and return the column list for COPY"""
+    header = next(csv.reader([stream.readline()]), None)
+    if not header:
+        raise QuestionImportError("CSV file is empty")
+    columns = [column.strip().lower() for column in header]
+    unknown = [column for column in columns if column not in IMPORT_COLUMNS]
+    if unknown:
+        raise QuestionImportError(f"Unknown columns: {', '.join(unknown)}")
+    missing = [column for column in QUESTION_COLUMNS if column not in columns]
+    if missing:
+        raise QuestionImportError(f"Missing columns: {', '.join(missing)}")
+    if len(set(columns)) != len(columns):
+        raise QuestionImportError("Duplicate columns in CSV header")
+    return columns
+
+
+def _copy_in(sql, stream):
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(sql, stream)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def import_questions(stream, fmt):
+    """Load a CSV or NDJSON text stream into `question` without committing.
+
+    Returns counts of inserted, updated and unchanged questions, and of
+    rows superseded by a later row with the same question text. Raises
+    QuestionImportError, before anything is written, if any row is
+    invalid.
+    """
+    if fmt == 'csv':
+        columns = _csv_columns(stream)
+    elif fmt == 'ndjson':
+        columns = list(QUESTION_COLUMNS)
+        stream = _LineReader(_ndjson_as_csv(stream))
+    else:
+        raise QuestionImportError("Format must be csv or ndjson")
+
+    db.session.execute(text(f"""
+        CREATE TEMP TABLE question_import (
+            line bigserial,
+            {', '.join(f'{column} text' for column in IMPORT_COLUMNS)}
+        ) ON COMMIT DROP
+    """))
+    total = _copy_in(
+        f"COPY question_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", stream
+    )
+
+    invalid = db.session.execute(text("""
+        SELECT line, error FROM (
+            SELECT line, CASE
+                WHEN coalesce(question_text, '') = '' THEN 'question_text is required'
+                WHEN level IS NULL OR level !~ '^\\s*[0-9]{1,9}\\s*$' THEN 'level must be 1, 2 or 3'
+                WHEN level::int <> ALL(:levels) THEN 'level must be 1, 2 or 3'
+                WHEN upper(trim(coalesce(correct_option, ''))) NOT IN ('A', 'B', 'C', 'D')
+                    THEN 'correct_option must be one of A, B, C, D'
+            END AS error
+            FROM question_import
+        ) checked
+        WHERE error IS NOT NULL
+        ORDER BY line
+        LIMIT :limit
+    """), {"limit": INVALID_ROWS_REPORTED, "levels": list(VALID_LEVELS)}).all()
+    if invalid:
+        raise QuestionImportError(
+            "Some rows are invalid, nothing was imported",
+            [{"row": line, "error": error} for line, error in invalid]
+        )
+
+    # Matching on text has no unique constraint behind it, so keep other
+    # writers out until the merge commits.
+    db.session.execute(text("LOCK TABLE question IN SHARE ROW EXCLUSIVE MODE"))
+    db.session.execute(text("""
+        CREATE TEMP TABLE question_import_latest ON COMMIT DROP AS
+        SELECT DISTINCT ON (question_text)
+               question_text, option_a, option_b, option_c, option_d,
+               upper(trim(correct_option)) AS correct_option,
+               trim(level)::int AS level
+        FROM question_import
+        ORDER BY question_text, line DESC
+    """))
+    updated = db.session.execute(text("""
+        UPDATE question q
+        SET option_a = s.option_a, option_b = s.option_b, option_c = s.option_c,
+            option_d = s.option_d, correct_option = s.correct_option, level = s.level
+        FROM question_import_latest s
+        WHERE q.question_text = s.question_text
+          AND (q.option_a, q.option_b, q.option_c, q.option_d, q.correct_option, q.level)
+              IS DISTINCT FROM (s.option_a, s.option_b, s.option_c, s.option_d, s.correct_option, s.level)
+    """)).rowcount
+    inserted = db.session.execute(text("""
+        INSERT INTO question (question_text, option_a, option_b, option_c, option_d, correct_option, level)
+        SELECT s.question_text, s.option_a, s.option_b, s.option_c, s.option_d, s.correct_option, s.level
+        FROM question_import_latest s
+        WHERE NOT EXISTS (SELECT 1 FROM question q WHERE q.question_text = s.question_text)
+    """)).rowcount
+    distinct = db.session.execute(text("SELECT count(*) FROM question_import_latest")).scalar_one()
+
+    if updated or inserted:
+        bump_bank_version()
+    return {
+        "rows": total,
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": distinct - inserted - updated,
+        "superseded": total - distinct,
+    }
+
+
+class _QueueWriter:
+    """File-like target for COPY TO that hands chunks to another thread"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def write(self, data):
+        if self.closed:
+            raise IOError("Export consumer went away")
+        self.chunks.put(data.encode() if isinstance(data, str) else data)
+
+
+def _export_sql(fmt):
+    select = f"SELECT id, {', '.join(QUESTION_COLUMNS)} FROM question ORDER BY id"
+    if fmt == 'csv':
+        return f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    if fmt == 'ndjson':
+        # One JSON document per row. JSON never contains raw control
+        # characters, so with \x01 as the quote character COPY leaves it
+        # unquoted.
+        return (
+            f"COPY (SELECT row_to_json(q) FROM ({select}) q) TO STDOUT "
+            f"WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')"
+        )
+    raise QuestionImportError("Format must be csv or ndjson")
+
+
+def copy_questions_to(target, fmt):
+    """COPY the whole bank to a writable file object"""
+    sql = _export_sql(fmt)
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.copy_expert(sql, target)
+        cursor.close()
+        connection.rollback()
+    finally:
+        connection.close()
+
+
+def stream_questions(fmt, app):
+    """Yield the exported bank as byte chunks with bounded buffering.
+
+    COPY runs on its own connection in a background thread, writing into
+    a small queue that this generator drains.
+    """
+    _export_sql(fmt)
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    writer = _QueueWriter(chunks)
+    done = object()
+    failure = []
+
+    def run():
+        try:
+            with app.app_context():
+                copy_questions_to(writer, fmt)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            chunks.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+        if failure:
+            raise failure[0]
+    finally:
+        writer.closed = True
+        # Unblock the COPY thread if the client disconnected mid-export.
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,50 @@
+from sqlalchemy import Integer, column, select, update, values
+
+from .models import Question
+from .question_bank import bump_bank_version
+from .shared import db
+
+VALID_LEVELS = (1, 2, 3)
+MAX_LEVEL_UPDATES = 10000
+
+
+def apply_question_levels(levels_by_id):
+    """Set many question levels in one statement, without committing.
+
+    levels_by_id maps question id to its new level. Returns a dict of
+    question id to 'updated', 'unchanged' or 'not_found'. The bank
+    version is bumped once if anything changed.
+    """
+    if not levels_by_id:
+        return {}
+
+    new_levels = values(
+        column('id', Integer), column('level', Integer), name='new_levels'
+    ).data(list(levels_by_id.items()))
+    updated = set(db.session.execute(
+        update(Question)
+        .where(Question.id == new_levels.c.id)
+        .where(Question.level != new_levels.c.level)
+        .values(level=new_levels.c.level)
+        .returning(Question.id)
+    ).scalars())
+
+    rest = [question_id for question_id in levels_by_id if question_id not in updated]
+    found = set()
+    if rest:
+        found = set(db.session.execute(
+            select(Question.id).where(Question.id.in_(rest))
+        ).scalars())
+
+    if updated:
+        bump_bank_version()
+
+    outcomes = {}
+    for question_id in levels_by_id:
+        if question_id in updated:
+            outcomes[question_id] = 'updated'
+        elif question_id in found:
+            outcomes[question_id] = 'unchanged'
+        else:
+            outcomes[question_id] = 'not_found'
+    return outcomes
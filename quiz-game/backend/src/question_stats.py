@@ -0,0 +1,126 @@
+from sqlalchemy import Float, case, cast, func, nulls_last, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import Question, QuestionStats
+from .partitions import ANSWER_COUNTS_SQL
+from .shared import db
+
+PICK_COLUMNS = ('picked_a', 'picked_b', 'picked_c', 'picked_d')
+STATS_SORTS = ('correct_rate', 'attempts', 'question_id')
+
+
+def record_question_answers(graded):
+    """Add submitted answers to the per-question counters.
+
+    graded is a list of (question_id, selected_index, is_correct), from
+    one submission or several; answers to the same question are summed
+    first. All rows go in one upsert, in question id order so concurrent
+    submissions lock shared counter rows in the same order.
+    """
+    if not graded:
+        return
+    rows = {}
+    for question_id, selected_index, is_correct in graded:
+        row = rows.get(question_id)
+        if row is None:
+            row = rows[question_id] = dict.fromkeys(('attempts', 'correct', 'picked_other') + PICK_COLUMNS, 0)
+            row["question_id"] = question_id
+        row["attempts"] += 1
+        row["correct"] += int(bool(is_correct))
+        row["picked_other"] += int(selected_index is None)
+        if selected_index is not None and 0 <= selected_index < len(PICK_COLUMNS):
+            row[PICK_COLUMNS[selected_index]] += 1
+    rows = [rows[question_id] for question_id in sorted(rows)]
+
+    table = QuestionStats.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.question_id],
+        set_={
+            column: table.c[column] + stmt.excluded[column]
+            for column in ('attempts', 'correct', 'picked_other') + PICK_COLUMNS
+        }
+    )
+    db.session.execute(stmt)
+
+
+def backfill_question_stats(question_ids=None):
+    """Rebuild the counters from user_quiz_answer, for all or some questions.
+
+    Correctness follows QuestionBank.is_correct: an option index must
+    match the answer key, an unmatched text answer must equal the
+    correct option's text. Answers in archived partitions count as they
+    were graded when archived. Returns the number of rows written.
+    """
+    where = "WHERE a.question_id = ANY(:question_ids)" if question_ids else ""
+    params = {"question_ids": list(question_ids)} if question_ids else {}
+    if question_ids:
+        db.session.execute(text("DELETE FROM question_stats WHERE question_id = ANY(:question_ids)"), params)
+    else:
+        db.session.execute(text("DELETE FROM question_stats"))
+
+    archived_where = "WHERE question_id = ANY(:question_ids)" if question_ids else ""
+    result = db.session.execute(text(f"""
+        INSERT INTO question_stats
+            (question_id, attempts, correct, picked_a, picked_b, picked_c, picked_d, picked_other)
+        SELECT question_id, sum(attempts), sum(correct), sum(picked_a), sum(picked_b),
+               sum(picked_c), sum(picked_d), sum(picked_other)
+        FROM (
+            {ANSWER_COUNTS_SQL.format(answers='user_quiz_answer', where=where)}
+            UNION ALL
+            SELECT question_id, attempts, correct, picked_a, picked_b, picked_c, picked_d, picked_other
+            FROM question_stats_archive {archived_where}
+        ) counts
+        GROUP BY question_id
+    """), params)
+    db.session.commit()
+    return result.rowcount
+
+
+def list_question_stats(level=None, sort='correct_rate', descending=False, min_attempts=0, limit=100, offset=0):
+    """Per-question counters joined to their question, plus the total match count"""
+    attempts = func.coalesce(QuestionStats.attempts, 0)
+    correct_rate = case(
+        (attempts > 0, cast(QuestionStats.correct, Float) / attempts),
+        else_=None
+    )
+    query = select(
+        Question.id, Question.level, Question.question_text, Question.correct_option,
+        attempts.label('attempts'),
+        func.coalesce(QuestionStats.correct, 0).label('correct'),
+        correct_rate.label('correct_rate'),
+        *[func.coalesce(getattr(QuestionStats, column), 0).label(column)
+          for column in PICK_COLUMNS + ('picked_other',)]
+    ).outerjoin(QuestionStats, QuestionStats.question_id == Question.id)
+    if level is not None:
+        query = query.where(Question.level == level)
+    if min_attempts:
+        query = query.where(attempts >= min_attempts)
+
+    total = db.session.execute(select(func.count()).select_from(query.subquery())).scalar_one()
+
+    order_column = {'correct_rate': correct_rate, 'attempts': attempts, 'question_id': Question.id}[sort]
+    order = order_column.desc() if descending else order_column.asc()
+    rows = db.session.execute(
+        query.order_by(nulls_last(order), Question.id).limit(limit).offset(offset)
+    ).all()
+
+    questions = []
+    for row in rows:
+        questions.append({
+            "question_id": row.id,
+            "level": row.level,
+            "question": row.question_text,
+            "correct_option": row.correct_option,
+            "attempts": row.attempts,
+            "correct": row.correct,
+            "correct_rate": round(row.correct_rate, 4) if row.correct_rate is not None else None,
+            "picks": {
+                "A": row.picked_a,
+                "B": row.picked_b,
+                "C": row.picked_c,
+                "D": row.picked_d,
+                "other": row.picked_other,
+            },
+        })
+    return questions, total
@@ -0,0 +1,144 @@
+"""Suggest question levels from observed difficulty.
+
+Correct rates come from the question_stats counters, so a run reads one
+row per question instead of the answer history. Questions with enough
+attempts are ranked from easiest to hardest and cut into contiguous
+levels. Each cut starts at the correct-rate quantile that keeps today's
+level sizes, then moves to the nearest position where the level's
+estimated pass rate falls inside its target band, without any level
+shrinking below MIN_LEVEL_SHARE of its current size.
+"""
+import math
+
+import numpy as np
+
+from .progress import PASS_PERCENTAGE
+from .question_levels import VALID_LEVELS, apply_question_levels
+from .shared import db
+
+DEFAULT_PASS_BANDS = {1: (0.75, 0.95), 2: (0.55, 0.80), 3: (0.35, 0.60)}
+DEFAULT_MIN_ATTEMPTS = 30
+MIN_LEVEL_SHARE = 0.5
+
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+def estimate_pass_rate(mean_rate, quiz_size):
+    """Chance of scoring PASS_PERCENTAGE on a quiz of quiz_size questions.
+
+    Treats each question as an independent draw with the level's mean
+    correct rate and uses the normal approximation to the binomial
+    tail. Works elementwise on arrays.
+    """
+    mean_rate = np.asarray(mean_rate, dtype=float)
+    quiz_size = np.asarray(quiz_size, dtype=float)
+    needed = np.ceil(quiz_size * PASS_PERCENTAGE / 100)
+    expected = quiz_size * mean_rate
+    spread = np.sqrt(quiz_size * mean_rate * (1 - mean_rate))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (needed - 0.5 - expected) / spread
+        approx = 0.5 * np.asarray(_erfc(z / math.sqrt(2)), dtype=float)
+    return np.where(spread > 0, approx, (expected >= needed).astype(float))
+
+
+def load_question_rates():
+    """Arrays of question id, current level, attempts and correct answers"""
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT q.id, q.level, coalesce(s.attempts, 0), coalesce(s.correct, 0)
+            FROM question q LEFT JOIN question_stats s ON s.question_id = q.id
+            ORDER BY q.id
+        """)
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+    finally:
+        cursor.close()
+    return rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3]
+
+
+def _level_report(levels, rates, movable, quiz_size):
+    report = {}
+    for level in VALID_LEVELS:
+        in_level = levels == level
+        measured = in_level & movable
+        mean = float(rates[measured].mean()) if measured.any() else None
+        size = quiz_size or int(in_level.sum())
+        report[level] = {
+            "questions": int(in_level.sum()),
+            "mean_correct_rate": round(mean, 4) if mean is not None else None,
+            "estimated_pass_rate": round(float(estimate_pass_rate(mean, size)), 4)
+            if mean is not None and size else None,
+        }
+    return report
+
+
+def plan_levels(question_ids, levels, attempts, correct, bands=None,
+                min_attempts=DEFAULT_MIN_ATTEMPTS, quiz_size=None):
+    """Return (new levels array, report) for the given questions.
+
+    Questions with fewer than min_attempts attempts keep their level.
+    quiz_size is the number of questions per attempt; by default every
+    attempt covers the whole level.
+    """
+    bands = bands or DEFAULT_PASS_BANDS
+    order_levels = sorted(VALID_LEVELS)
+    movable = (attempts >= min_attempts) & np.isin(levels, order_levels)
+    rates = np.zeros(len(question_ids), dtype=float)
+    rates[attempts > 0] = correct[attempts > 0] / attempts[attempts > 0]
+
+    # Easiest first; ties keep question id order so runs are repeatable.
+    candidates = np.flatnonzero(movable)
+    ranked = candidates[np.argsort(-rates[candidates], kind='stable')]
+    ranked_rates = rates[ranked]
+    prefix = np.concatenate(([0.0], np.cumsum(ranked_rates)))
+    total = len(ranked)
+
+    fixed_counts = {level: int(((levels == level) & ~movable).sum()) for level in order_levels}
+    current_counts = np.array([int(((levels == level) & movable).sum()) for level in order_levels])
+    quantile_cuts = np.cumsum(current_counts)
+    floors = np.ceil(current_counts * MIN_LEVEL_SHARE).astype(int)
+
+    new_levels = levels.copy()
+    start = 0
+    for position, level in enumerate(order_levels):
+        remaining = len(order_levels) - position - 1
+        if remaining == 0 or start >= total:
+            end = total
+        else:
+            first = start + max(floors[position], 1)
+            last = total - max(int(floors[position + 1:].sum()), remaining)
+            ends = np.arange(first, max(first, last) + 1)
+            sizes = ends - start
+            means = (prefix[ends] - prefix[start]) / sizes
+            pass_rates = estimate_pass_rate(means, quiz_size or sizes + fixed_counts[level])
+            low, high = bands[level]
+            miss = np.maximum(low - pass_rates, 0) + np.maximum(pass_rates - high, 0)
+            best = np.lexsort((np.abs(ends - quantile_cuts[position]), miss))[0]
+            end = int(ends[best])
+        new_levels[ranked[start:end]] = level
+        start = end
+
+    report = {
+        "before": _level_report(levels, rates, movable, quiz_size),
+        "after": _level_report(new_levels, rates, movable, quiz_size),
+        "bands": {level: list(bands[level]) for level in order_levels},
+        "measured_questions": int(total),
+        "moves": int((new_levels != levels).sum()),
+    }
+    return new_levels, report
+
+
+def rebalance_levels(apply=False, bands=None, min_attempts=DEFAULT_MIN_ATTEMPTS, quiz_size=None):
+    """Plan new levels and, with apply, write them as one batch update.
+
+    Returns the report and a list of (question id, old level, new level).
+    """
+    question_ids, levels, attempts, correct = load_question_rates()
+    new_levels, report = plan_levels(question_ids, levels, attempts, correct, bands, min_attempts, quiz_size)
+
+    moved = np.flatnonzero(new_levels != levels)
+    moves = list(zip(question_ids[moved].tolist(), levels[moved].tolist(), new_levels[moved].tolist()))
+    if apply and moves:
+        apply_question_levels({question_id: new for question_id, _, new in moves})
+        db.session.commit()
+    return report, moves
@@ -0,0 +1,173 @@
+"""Recompute stored quiz scores after answer keys change.
+
+Answers are read a chunk of quizzes at a time and graded with NumPy
+against a dense answer-key array indexed by question id. Changed scores
+are written back with one UPDATE ... FROM unnest() per chunk. The level
+ledger and leaderboard rows of every affected user and the
+question_stats counters are rebuilt at the end.
+"""
+import numpy as np
+from sqlalchemy import text
+
+from .leaderboards import backfill_leaderboards
+from .progress import backfill_level_progress
+from .question_bank import get_question_bank
+from .question_stats import backfill_question_stats
+from .shared import db
+
+QUIZ_CHUNK_SIZE = 20000
+LEDGER_USER_BATCH = 10000
+NO_ANSWER_KEY = -2
+
+
+def build_answer_key(bank):
+    """Array mapping question id to its correct option index"""
+    size = max(bank.correct_indexes, default=0) + 1
+    key = np.full(size, NO_ANSWER_KEY, dtype=np.int16)
+    for question_id, correct_index in bank.correct_indexes.items():
+        if correct_index is not None:
+            key[question_id] = correct_index
+    return key
+
+
+def grade_answers(key, question_ids, selected_indexes):
+    """Boolean array of which answers are correct. -1 marks no index."""
+    known = question_ids < len(key)
+    correct = np.zeros(len(question_ids), dtype=bool)
+    correct[known] = key[question_ids[known]] == selected_indexes[known]
+    return correct
+
+
+def _fetch_rows(sql, params):
+    """Run sql on the session's DBAPI connection and return plain tuples.
+
+    Building arrays from SQLAlchemy Row objects is several times slower
+    than from tuples, so the chunk queries bypass the Result layer.
+    """
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _fetch_array(sql, params, columns):
+    return np.array(_fetch_rows(sql, params), dtype=np.int64).reshape(-1, columns)
+
+
+def _quiz_chunks(question_ids, chunk_size):
+    """Yield (where clause, params) selecting successive chunks of user_quiz ids.
+
+    With question_ids, each chunk's ids are looked up after the last id
+    of the previous one, so only one chunk of ids is held at a time.
+    """
+    if question_ids:
+        last = 0
+        while True:
+            quiz_ids = db.session.execute(text("""
+                SELECT DISTINCT user_quiz_id FROM user_quiz_answer
+                WHERE question_id = ANY(:question_ids) AND user_quiz_id > :last
+                ORDER BY user_quiz_id
+                LIMIT :chunk_size
+            """), {"question_ids": list(question_ids), "last": last, "chunk_size": chunk_size}).scalars().all()
+            if quiz_ids:
+                yield "= ANY(%(quiz_ids)s)", {"quiz_ids": quiz_ids}
+            if len(quiz_ids) < chunk_size:
+                return
+            last = quiz_ids[-1]
+
+    low, high = db.session.execute(text("SELECT min(id), max(id) FROM user_quiz")).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield "BETWEEN %(low)s AND %(high)s", {"low": start, "high": start + chunk_size - 1}
+
+
+def _chunk_scores(bank, key, where, params):
+    """Return (quiz ids, recomputed scores) for the quizzes in one chunk"""
+    answers = _fetch_array(f"""
+        SELECT user_quiz_id, question_id, coalesce(selected_index, -1)
+        FROM user_quiz_answer
+        WHERE user_quiz_id {where} AND question_id IS NOT NULL
+    """, params, 3)
+    if not len(answers):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    correct = grade_answers(key, answers[:, 1], answers[:, 2])
+    quiz_ids, positions = np.unique(answers[:, 0], return_inverse=True)
+    scores = np.bincount(positions, weights=correct, minlength=len(quiz_ids)).astype(np.int64)
+
+    # Answers that matched no option were stored as text. There are few
+    # of them, so they are graded one by one like submit_quiz does.
+    text_answers = _fetch_rows(f"""
+        SELECT user_quiz_id, question_id, selected_option
+        FROM user_quiz_answer
+        WHERE user_quiz_id {where} AND question_id IS NOT NULL AND selected_index IS NULL
+    """, params)
+    for quiz_id, question_id, selected_option in text_answers:
+        if bank.get(question_id) and bank.is_correct(question_id, None, selected_option):
+            scores[np.searchsorted(quiz_ids, quiz_id)] += 1
+
+    return quiz_ids, scores
+
+
+def regrade_scores(question_ids=None, dry_run=False, chunk_size=QUIZ_CHUNK_SIZE, on_change=None):
+    """Regrade stored quizzes against the current answer key.
+
+    With question_ids, only quizzes that answered one of them are
+    regraded. on_change(quiz_id, user_id, level, old, new) is called for
+    every score that differs. With dry_run nothing is written. Each
+    chunk commits on its own, so an interrupted run can simply be
+    repeated.
+    """
+    bank = get_question_bank()
+    key = build_answer_key(bank)
+    totals = {"quizzes": 0, "changed": 0, "users": 0}
+    affected_users = set()
+
+    for where, params in _quiz_chunks(question_ids, chunk_size):
+        quiz_ids, scores = _chunk_scores(bank, key, where, params)
+        if not len(quiz_ids):
+            continue
+
+        stored = _fetch_array("""
+            SELECT id, coalesce(user_id, 0), coalesce(level, 0), coalesce(score, -1)
+            FROM user_quiz WHERE id = ANY(%(ids)s) ORDER BY id
+        """, {"ids": quiz_ids.tolist()}, 4)
+        new_scores = scores[np.searchsorted(quiz_ids, stored[:, 0])]
+        changed = stored[:, 3] != new_scores
+        totals["quizzes"] += len(stored)
+        totals["changed"] += int(changed.sum())
+        if not changed.any():
+            continue
+
+        changed_rows = stored[changed]
+        changed_scores = new_scores[changed]
+        affected_users.update(changed_rows[:, 1].tolist())
+        if on_change:
+            for (quiz_id, user_id, level, old), new in zip(changed_rows.tolist(), changed_scores.tolist()):
+                on_change(quiz_id, user_id, level, None if old < 0 else old, new)
+
+        if not dry_run:
+            db.session.execute(text("""
+                UPDATE user_quiz u SET score = v.score
+                FROM unnest(CAST(:ids AS integer[]), CAST(:scores AS integer[])) AS v(id, score)
+                WHERE u.id = v.id
+            """), {"ids": changed_rows[:, 0].tolist(), "scores": changed_scores.tolist()})
+            db.session.commit()
+
+    affected_users.discard(0)
+    totals["users"] = len(affected_users)
+    if dry_run:
+        db.session.rollback()
+        return totals
+
+    users = sorted(affected_users)
+    for start in range(0, len(users), LEDGER_USER_BATCH):
+        batch = users[start:start + LEDGER_USER_BATCH]
+        backfill_level_progress(user_ids=batch)
+        backfill_leaderboards(len(bank.level_counts), user_ids=batch)
+    # The correct counts of the regraded questions follow the new key too.
+    backfill_question_stats(question_ids)
+    return totals
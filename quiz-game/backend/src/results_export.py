@@ -0,0 +1,173 @@
+"""Streaming export of quiz results as CSV or NDJSON.
+
+One row per stored answer, carrying its quiz, user and question, plus
+one row without answer columns for every quiz that has no answers, such
+as archived quizzes whose answers are only in the archive files. Rows
+come in (quiz_id, answer_id) order from a server-side cursor and are
+written out EXPORT_FETCH_ROWS at a time, so memory stays flat however
+many rows match.
+
+Every row has a `cursor` column. Passing the cursor of the last row
+received, with the same filters, resumes the export after that row; a
+resumed CSV export has no header, so it can be appended to the part
+already written.
+
+Quizzes are ordered by id, so a quiz whose id was taken before the
+export reached it but that committed afterwards is only picked up by a
+new export.
+"""
+import base64
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select, tuple_
+
+from .models import User, UserQuizAnswer
+from .partitions import quiz_summaries
+from .question_bank import get_question_bank
+from .shared import db
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_FETCH_ROWS = 5000
+EXPORT_COLUMNS = (
+    'quiz_id', 'user_id', 'username', 'level', 'score', 'total_questions', 'submitted_at', 'archived',
+    'question_id', 'question_text', 'selected_answer', 'correct_answer', 'is_correct', 'cursor'
+)
+
+
+class ExportFilterError(ValueError):
+    """An export filter or cursor that can't be used"""
+
+
+def encode_export_cursor(quiz_id, answer_id):
+    """Opaque token for the row after (quiz_id, answer_id); answer_id is 0 for a quiz without answers"""
+    raw = f"{quiz_id}|{answer_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_export_cursor(cursor):
+    """(quiz_id, answer_id) from encode_export_cursor. Raises ExportFilterError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        quiz_id, answer_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return int(quiz_id), int(answer_id)
+    except ValueError:
+        raise ExportFilterError("cursor must come from the cursor column of an export")
+
+
+def parse_export_filters(user_ids=None, level=None, since=None, until=None):
+    """Export filters from raw strings. since is inclusive, until exclusive; both ISO dates or datetimes."""
+    filters = {}
+    try:
+        if user_ids:
+            filters["user_ids"] = [int(user_id) for user_id in user_ids]
+        if level not in (None, ''):
+            filters["level"] = int(level)
+    except ValueError:
+        raise ExportFilterError("user_id and level must be integers")
+    for name, value in (("since", since), ("until", until)):
+        if value:
+            try:
+                filters[name] = datetime.fromisoformat(value)
+            except ValueError:
+                raise ExportFilterError(f"{name} must be an ISO date or datetime")
+    return filters
+
+
+def export_statement(filters, cursor=None):
+    """SELECT of the rows to export in cursor order, starting after cursor"""
+    quiz = quiz_summaries().c
+    quizzes = select(
+            quiz.id, quiz.user_id, quiz.level, quiz.score,
+            quiz.total_questions, quiz.submitted_at, quiz.archived)
+    if filters.get("user_ids"):
+        quizzes = quizzes.where(quiz.user_id.in_(filters["user_ids"]))
+    if filters.get("level") is not None:
+        quizzes = quizzes.where(quiz.level == filters["level"])
+    if filters.get("since"):
+        quizzes = quizzes.where(quiz.submitted_at >= filters["since"])
+    if filters.get("until"):
+        quizzes = quizzes.where(quiz.submitted_at < filters["until"])
+    if cursor:
+        quizzes = quizzes.where(quiz.id >= cursor[0])
+    quizzes = quizzes.subquery()
+
+    answer_id = func.coalesce(UserQuizAnswer.id, 0)
+    statement = select(
+            quizzes, User.username, answer_id.label('answer_id'), UserQuizAnswer.question_id,
+            UserQuizAnswer.selected_index, UserQuizAnswer.selected_option)\
+        .outerjoin(User, User.id == quizzes.c.user_id)\
+        .outerjoin(UserQuizAnswer, (UserQuizAnswer.user_quiz_id == quizzes.c.id)
+                   & (UserQuizAnswer.submitted_at == quizzes.c.submitted_at))
+    if cursor:
+        statement = statement.where(tuple_(quizzes.c.id, answer_id) > tuple_(*cursor))
+    return statement.order_by(quizzes.c.id, answer_id)
+
+
+def export_row(row, bank):
+    """One exported row as a dict in EXPORT_COLUMNS order"""
+    question = bank.get(row.question_id) if row.question_id is not None else None
+    return {
+        "quiz_id": row.id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "level": row.level,
+        "score": row.score,
+        "total_questions": row.total_questions,
+        "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+        "archived": row.archived,
+        "question_id": row.question_id,
+        "question_text": question["question"] if question else None,
+        "selected_answer": bank.answer_text(row.question_id, row.selected_index, row.selected_option)
+            if question else row.selected_option,
+        "correct_answer": question["answer"] if question else None,
+        "is_correct": bank.is_correct(row.question_id, row.selected_index, row.selected_option)
+            if question else None,
+        "cursor": encode_export_cursor(row.id, row.answer_id),
+    }
+
+
+def _encode_chunk(rows, fmt, bank, header=False):
+    out = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        if header:
+            writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(export_row(row, bank).values())
+    else:
+        for row in rows:
+            out.write(json.dumps(export_row(row, bank), separators=(",", ":")))
+            out.write("\n")
+    return out.getvalue().encode()
+
+
+def stream_results(fmt, filters, cursor=None):
+    """Yield the export as byte chunks of up to EXPORT_FETCH_ROWS rows.
+
+    Runs on the current session, which stays in one read transaction
+    until the generator finishes or is closed.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportFilterError("format must be csv or ndjson")
+    bank = get_question_bank()
+    result = db.session.execute(
+        export_statement(filters, cursor),
+        execution_options={"stream_results": True, "yield_per": EXPORT_FETCH_ROWS}
+    )
+    try:
+        header = fmt == 'csv' and not cursor
+        for rows in result.partitions():
+            yield _encode_chunk(rows, fmt, bank, header)
+            header = False
+        if header:
+            yield _encode_chunk([], fmt, bank, header)
+    except Exception as e:
+        logging.error(f"Error exporting results: {str(e)}")
+        raise
+    finally:
+        result.close()
+        db.session.rollback()
@@ -1,69 +1,109 @@
+import base64
+import io
 import logging
 import os
 import json
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func
+from sqlalchemy import func, insert, select, tuple_
+from .auth import admin_required
+from .answer_writer import persist_answers, write_answers, write_behind_enabled
+from .attempts import AttemptError, default_attempt_seed, issue_attempt_token, load_attempt_token
+from .database import READ_AFTER_HEADER, replica_reads, write_position
+from .leaderboards import ALL_LEVELS, BOARDS, get_leaderboard, record_leaderboard_attempt
 from .models import Question, UserQuiz, UserQuizAnswer
+from .partitions import quiz_summaries
+from .provisioning import detect_format
+from .progress import (
+    get_level_question_counts, get_user_level_progress, graded_out_of, level_percentage, record_level_attempt
+)
+from .question_bank import (
+    bump_bank_version, encode_json, get_question_bank, get_question_bank_stats,
+    json_payload_response, make_etag
+)
+from .question_io import QuestionImportError, import_questions, stream_questions
+from .question_stats import STATS_SORTS, list_question_stats
+from .results_export import ExportFilterError, decode_export_cursor, parse_export_filters, stream_results
+from .question_levels import MAX_LEVEL_UPDATES, VALID_LEVELS, apply_question_levels
 from .shared import db
 
 quiz_bp = Blueprint('quiz', __name__, url_prefix='/api')
 
-def get_option_text_by_letter(question, letter):
-    """Convert option letter (A, B, C, D) to actual option text"""
-    option_map = {
-        'A': question.option_a,
-        'B': question.option_b,
-        'C': question.option_c,
-        'D': question.option_d
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def parse_questions_args():
+    """(count, seed) from the /api/questions query string; raises ValueError"""
+    count = request.args.get('count', type=int)
+    seed = request.args.get('seed', type=int)
+    if 'count' in request.args and (count is None or count < 1):
+        raise ValueError(count)
+    if 'seed' in request.args and seed is None:
+        raise ValueError(seed)
+    return count, seed
+
+def questions_response(user_id, bank, ledger, count=None, seed=None):
+    """Build the /api/questions response from a bank snapshot and the user's ledger"""
+    level_counts = bank.level_counts
+    current_level = get_user_current_level(user_id, level_counts, ledger)
+    
+    if not bank.level_ids.get(current_level):
+        return jsonify({
+            "questions": [],
+            "current_level": current_level,
+            "total_levels": 3,
+            "message": f"No questions available for level {current_level}"
+        }), 200
+    
+    
+    level_info = get_level_progress_info(user_id, current_level, level_counts, ledger)
+    attempt = {
+        "current_level": current_level,
+        "total_levels": 3,
+        "level_info": level_info
     }
-    return option_map.get(letter.upper(), '')
+    
+    if count is None or count >= level_counts[current_level]:
+        count = None
+        seed = None
+        questions_body, questions_etag = bank.level_payload(current_level)
+    else:
+        if seed is None:
+            seed = default_attempt_seed(user_id, current_level, level_info["attempts"])
+        questions_body = bank.questions_payload(bank.attempt_question_ids(current_level, seed, count))
+        questions_etag = make_etag(questions_body)
+        attempt["seed"] = seed
+    
+    attempt["attempt_token"] = issue_attempt_token(
+        user_id, current_level, bank.version, level_info["attempts"], seed, count
+    )
+    user_body = encode_json(attempt)
+    
+    
+    body = b'{"questions":' + questions_body + b',' + user_body[1:]
+    return json_payload_response(body, make_etag(questions_etag.encode(), user_body))
 
 @quiz_bp.route('/questions')
 @jwt_required()
+@replica_reads
 def get_questions():
+    """Questions for the user's current level.
+
+    `count` returns a random subset of that many questions instead of
+    the whole level, drawn with `seed` (or a per-attempt seed if none is
+    given) so the same attempt can be re-derived at submit time. Such an
+    attempt is graded out of the questions it was given.
+    """
     try:
         user_id = int(get_jwt_identity())
-        
-        
-        current_level = get_user_current_level(user_id)
-        
-        
-        questions = Question.query.filter_by(level=current_level).order_by(Question.id).all()
-        
-        if not questions:
-            return jsonify({
-                "questions": [],
-                "current_level": current_level,
-                "total_levels": 3,
-                "message": f"No questions available for level {current_level}"
-            }), 200
-        
-        
-        formatted_questions = []
-        for question in questions:
-            
-            correct_answer_text = get_option_text_by_letter(question, question.correct_option)
-            
-            formatted_questions.append({
-                "id": question.id,
-                "question": question.question_text,
-                "options": [
-                    question.option_a,
-                    question.option_b,
-                    question.option_c,
-                    question.option_d
-                ],
-                "answer": correct_answer_text,  
-                "level": question.level
-            })
-        
-        return jsonify({
-            "questions": formatted_questions,
-            "current_level": current_level,
-            "total_levels": 3,
-            "level_info": get_level_progress_info(user_id, current_level)
-        }), 200
+        try:
+            count, seed = parse_questions_args()
+        except ValueError:
+            return jsonify({"error": "count must be a positive integer and seed an integer"}), 400
+        bank = get_question_bank()
+        ledger = get_user_level_progress(user_id)
+        return questions_response(user_id, bank, ledger, count, seed)
         
     except Exception as e:
         logging.error(f"Error fetching questions: {str(e)}")
@@ -71,42 +111,80 @@ def get_questions():
 
 @quiz_bp.route('/all-questions')
 @jwt_required()
+@replica_reads
 def get_all_questions():
     """Get all questions for settings/admin purposes"""
     try:
         
-        questions = Question.query.order_by(Question.level, Question.id).all()
-        
-        
-        formatted_questions = []
-        for question in questions:
-            
-            correct_answer_text = get_option_text_by_letter(question, question.correct_option)
-            
-            formatted_questions.append({
-                "id": question.id,
-                "question": question.question_text,
-                "options": [
-                    question.option_a,
-                    question.option_b,
-                    question.option_c,
-                    question.option_d
-                ],
-                "answer": correct_answer_text,
-                "level": question.level
-            })
-        
-        return jsonify({
-            "questions": formatted_questions,
-            "total_questions": len(formatted_questions)
-        }), 200
+        body, etag = get_question_bank().all_payload()
+        return json_payload_response(body, etag)
         
     except Exception as e:
         logging.error(f"Error fetching all questions: {str(e)}")
         return jsonify({"error": "Failed to fetch questions"}), 500
 
-@quiz_bp.route('/update-question-level', methods=['PUT'])
+@quiz_bp.route('/question-bank/stats')
+@admin_required
+def question_bank_stats():
+    """Cache counters for the in-process question bank"""
+    return jsonify(get_question_bank_stats()), 200
+
+@quiz_bp.route('/question-stats')
+@admin_required
+def question_stats():
+    """Per-question attempt, correct-rate and option-pick counters"""
+    try:
+        level = request.args.get('level', type=int)
+        sort = request.args.get('sort', 'correct_rate')
+        order = request.args.get('order', 'asc')
+        min_attempts = request.args.get('min_attempts', 0, type=int)
+        limit = request.args.get('limit', 100, type=int)
+        offset = request.args.get('offset', 0, type=int)
+
+        if sort not in STATS_SORTS or order not in ('asc', 'desc'):
+            return jsonify({"error": f"sort must be one of {', '.join(STATS_SORTS)} and order asc or desc"}), 400
+        if not 1 <= limit <= 1000 or offset < 0 or min_attempts < 0:
+            return jsonify({"error": "limit must be between 1 and 1000, offset and min_attempts not negative"}), 400
+
+        questions, total = list_question_stats(
+            level=level, sort=sort, descending=order == 'desc',
+            min_attempts=min_attempts, limit=limit, offset=offset
+        )
+        return jsonify({"questions": questions, "total": total}), 200
+
+    except Exception as e:
+        logging.error(f"Error fetching question stats: {str(e)}")
+        return jsonify({"error": "Failed to fetch question stats"}), 500
+
+@quiz_bp.route('/leaderboard')
 @jwt_required()
+def leaderboard():
+    """Top entries of one leaderboard and the caller's rank on it.
+
+    `board` is best_score, fewest_attempts or weekly; `level` 0 (the
+    default) ranks across all levels.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        board = request.args.get('board', 'best_score')
+        level = request.args.get('level', ALL_LEVELS, type=int)
+        limit = request.args.get('limit', 10, type=int)
+
+        if board not in BOARDS:
+            return jsonify({"error": f"board must be one of {', '.join(BOARDS)}"}), 400
+        if level != ALL_LEVELS and level not in VALID_LEVELS:
+            return jsonify({"error": "level must be 0 (all levels), 1, 2 or 3"}), 400
+        if not 1 <= limit <= 100:
+            return jsonify({"error": "limit must be between 1 and 100"}), 400
+
+        return jsonify(get_leaderboard(board, level, user_id, limit)), 200
+
+    except Exception as e:
+        logging.error(f"Error fetching leaderboard: {str(e)}")
+        return jsonify({"error": "Failed to fetch leaderboard"}), 500
+
+@quiz_bp.route('/update-question-level', methods=['PUT'])
+@admin_required
 def update_question_level():
     """Update the level of a specific question"""
     try:
@@ -117,7 +195,7 @@ def update_question_level():
         if not question_id or not new_level:
             return jsonify({"error": "Question ID and level are required"}), 400
         
-        if new_level not in [1, 2, 3]:
+        if new_level not in VALID_LEVELS:
             return jsonify({"error": "Level must be 1, 2, or 3"}), 400
         
         question = Question.query.filter_by(id=question_id).first()
@@ -126,6 +204,7 @@ def update_question_level():
         
        
         question.level = new_level
+        bump_bank_version()
         db.session.commit()
         
         return jsonify({
@@ -138,30 +217,143 @@ def update_question_level():
         logging.error(f"Error updating question level: {str(e)}")
         return jsonify({"error": "Failed to update question level"}), 500
 
-def get_user_current_level(user_id):
+@quiz_bp.route('/update-question-levels', methods=['PUT'])
+@admin_required
+def update_question_levels():
+    """Update the levels of many questions in one transaction"""
+    try:
+        data = request.get_json(silent=True) or {}
+        updates = data.get('updates')
+
+        if not isinstance(updates, list) or not updates:
+            return jsonify({"error": "updates must be a non-empty list of {question_id, level}"}), 400
+        if len(updates) > MAX_LEVEL_UPDATES:
+            return jsonify({"error": f"At most {MAX_LEVEL_UPDATES} updates per request"}), 400
+
+        results = []
+        levels_by_id = {}
+        for entry in updates:
+            entry = entry if isinstance(entry, dict) else {}
+            question_id = entry.get('question_id')
+            new_level = entry.get('level')
+            result = {"question_id": question_id, "level": new_level}
+            if type(question_id) is not int or question_id < 1:
+                result.update(status="invalid", error="question_id must be a positive integer")
+            elif new_level not in VALID_LEVELS or type(new_level) is not int:
+                result.update(status="invalid", error="Level must be 1, 2, or 3")
+            elif question_id in levels_by_id:
+                result.update(status="invalid", error="Duplicate question_id")
+            else:
+                levels_by_id[question_id] = new_level
+            results.append(result)
+
+        outcomes = apply_question_levels(levels_by_id)
+
+        counts = {"updated": 0, "unchanged": 0, "not_found": 0, "invalid": 0}
+        for result in results:
+            if "status" not in result:
+                result["status"] = outcomes[result["question_id"]]
+            counts[result["status"]] += 1
+        response = jsonify({**counts, "results": results})
+
+        db.session.commit()
+        return response, 200
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error updating question levels: {str(e)}")
+        return jsonify({"error": "Failed to update question levels"}), 500
+
+@quiz_bp.route('/questions/import', methods=['POST'])
+@admin_required
+def import_questions_endpoint():
+    """Upsert questions from a CSV or NDJSON request body, matched on question text"""
+    fmt = request.args.get('format') or detect_format(request.mimetype)
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"}), 400
+
+    try:
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        counts = import_questions(stream, fmt)
+        db.session.commit()
+        return jsonify(counts), 200
+
+    except QuestionImportError as e:
+        db.session.rollback()
+        return jsonify({"error": e.message, "invalid_rows": e.invalid_rows}), 400
+    except UnicodeDecodeError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error importing questions: {str(e)}")
+        return jsonify({"error": "Failed to import questions"}), 500
+
+@quiz_bp.route('/questions/export')
+@admin_required
+def export_questions_endpoint():
+    """Stream the whole question bank as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(stream_questions(fmt, current_app._get_current_object())),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=questions.{fmt}'}
+    )
+
+@quiz_bp.route('/results/export')
+@admin_required
+@replica_reads
+def export_results_endpoint():
+    """Stream every stored answer with its quiz, user and question as CSV or NDJSON.
+
+    Filters: `user_id` (repeatable), `level`, `since` (inclusive) and
+    `until` (exclusive) as ISO dates. `cursor` resumes after the row that
+    carried it.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        filters = parse_export_filters(
+            request.args.getlist('user_id'), request.args.get('level'),
+            request.args.get('since'), request.args.get('until')
+        )
+        cursor = decode_export_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ExportFilterError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(stream_results(fmt, filters, cursor)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=results.{fmt}'}
+    )
+
+def get_user_current_level(user_id, level_counts=None, ledger=None):
     """Determine the current level a user should be playing"""
+    if level_counts is None:
+        level_counts = get_level_question_counts()
+    if ledger is None:
+        ledger = get_user_level_progress(user_id)
     
     
     has_completed_all_levels = True
     for level in [1, 2, 3]:
-        total_questions = Question.query.filter_by(level=level).count()
+        total_questions = level_counts.get(level, 0)
         if total_questions == 0:
             continue
             
-        level_quizzes = db.session.query(UserQuiz.score)\
-            .join(UserQuizAnswer, UserQuiz.id == UserQuizAnswer.user_quiz_id)\
-            .join(Question, UserQuizAnswer.question_id == Question.id)\
-            .filter(UserQuiz.user_id == user_id)\
-            .filter(Question.level == level)\
-            .group_by(UserQuiz.id)\
-            .all()
+        row = ledger.get(level)
             
-        if not level_quizzes:
+        if not row:
             has_completed_all_levels = False
             break
             
-        best_score = max([quiz.score for quiz in level_quizzes]) if level_quizzes else 0
-        percentage = (best_score / total_questions) * 100 if total_questions > 0 else 0
+        percentage = row.best_percentage
         
         if percentage < 80:   
             has_completed_all_levels = False
@@ -170,55 +362,39 @@ def get_user_current_level(user_id):
     
     if has_completed_all_levels:
         
-        latest_quiz = db.session.query(UserQuiz)\
-            .join(UserQuizAnswer, UserQuiz.id == UserQuizAnswer.user_quiz_id)\
-            .join(Question, UserQuizAnswer.question_id == Question.id)\
-            .filter(UserQuiz.user_id == user_id)\
-            .order_by(UserQuiz.submitted_at.desc())\
-            .first()
+        attempted = [row for row in ledger.values() if row.last_attempt_at is not None]
         
-        if latest_quiz:
+        if attempted:
             
-            latest_quiz_answer = UserQuizAnswer.query.filter_by(user_quiz_id=latest_quiz.id).first()
-            if latest_quiz_answer:
-                latest_question = Question.query.filter_by(id=latest_quiz_answer.question_id).first()
-                if latest_question:
-                    latest_level = latest_question.level
+            latest = max(attempted, key=lambda row: (row.last_attempt_at, -row.level))
+            latest_level = latest.level
                     
                     
-                    total_questions = Question.query.filter_by(level=latest_level).count()
-                    percentage = (latest_quiz.score / total_questions) * 100 if total_questions > 0 else 0
+            percentage = latest.last_percentage
                     
-                    if percentage >= 70:
-                        
-                        return 1 if latest_level >= 3 else latest_level + 1
-                    else:
-                        
-                        return latest_level
+            if percentage >= 70:
+                
+                return 1 if latest_level >= 3 else latest_level + 1
+            else:
+                
+                return latest_level
         
         
         return 1
     
     
     for level in [1, 2, 3]:
-        total_questions = Question.query.filter_by(level=level).count()
+        total_questions = level_counts.get(level, 0)
         
         if total_questions == 0:
             continue
             
-        level_quizzes = db.session.query(UserQuiz.score)\
-            .join(UserQuizAnswer, UserQuiz.id == UserQuizAnswer.user_quiz_id)\
-            .join(Question, UserQuizAnswer.question_id == Question.id)\
-            .filter(UserQuiz.user_id == user_id)\
-            .filter(Question.level == level)\
-            .group_by(UserQuiz.id)\
-            .all()
+        row = ledger.get(level)
             
-        if not level_quizzes:
+        if not row:
             return level
             
-        best_score = max([quiz.score for quiz in level_quizzes]) if level_quizzes else 0
-        percentage = (best_score / total_questions) * 100 if total_questions > 0 else 0
+        percentage = row.best_percentage
         
         if percentage < 80:   
             return level
@@ -226,23 +402,23 @@ def get_user_current_level(user_id):
     
     return 1
 
-def get_level_progress_info(user_id, current_level):
+def get_level_progress_info(user_id, current_level, level_counts=None, ledger=None):
     """Get progress information for the current level"""
-    total_questions = Question.query.filter_by(level=current_level).count()
+    if level_counts is None:
+        level_counts = get_level_question_counts()
+    if ledger is None:
+        ledger = get_user_level_progress(user_id)
+    total_questions = level_counts.get(current_level, 0)
     
     
-    level_quizzes = db.session.query(UserQuiz.score)\
-        .join(UserQuizAnswer, UserQuiz.id == UserQuizAnswer.user_quiz_id)\
-        .join(Question, UserQuizAnswer.question_id == Question.id)\
-        .filter(UserQuiz.user_id == user_id)\
-        .filter(Question.level == current_level)\
-        .group_by(UserQuiz.id)\
-        .all()
+    row = ledger.get(current_level)
     
-    best_score = max([quiz.score for quiz in level_quizzes]) if level_quizzes else 0
-    attempts = len(level_quizzes)
+    best_score = row.best_score if row else 0
+    attempts = row.attempts if row else 0
     
-    percentage = (best_score / total_questions) * 100 if total_questions > 0 else 0
+    percentage = 0
+    if total_questions > 0:
+        percentage = row.best_percentage if row else 0.0
     
     return {
         "total_questions": total_questions,
@@ -257,51 +433,104 @@ def get_level_progress_info(user_id, current_level):
 def submit_quiz():
     try:
         user_id = int(get_jwt_identity())
-        data = request.get_json().get('answers', {})
+        payload = request.get_json()
+        data = payload.get('answers', {})
+        submitted = [(int(question_id_str), selected) for question_id_str, selected in data.items()]
+        # Keys like "1" and "01" name the same question.
+        if len({question_id for question_id, _ in submitted}) != len(submitted):
+            return jsonify({"error": "Each question can only be answered once"}), 400
         score = 0
         answers = []
+        graded = []
         question_ids = []
+        correct_answers = {}
+        quiz_level = None
+        current_level = None
 
         
-        for question_id_str, selected in data.items():
-            question_id = int(question_id_str)
-            question = Question.query.filter_by(id=question_id).first()
+        bank = get_question_bank()
+        attempt = None
+        
+        if payload.get('attempt_token'):
+            attempt = load_attempt_token(payload['attempt_token'], user_id)
+            if attempt["bank_version"] > bank.version:
+                # Signed by a worker whose bank is newer than this one's copy.
+                bank = get_question_bank(min_version=attempt["bank_version"])
+            if attempt["bank_version"] < bank.version:
+                raise AttemptError("The questions have changed, please reload the quiz", 409)
+            attempt_ids = bank.attempt_question_ids(attempt["level"], attempt["seed"], attempt["count"])
+            submitted_ids = [question_id for question_id, _ in submitted]
+            if sorted(submitted_ids) != attempt_ids:
+                raise AttemptError("Answers must cover exactly the questions of this attempt")
+        elif current_app.config.get('REQUIRE_ATTEMPT_TOKEN'):
+            raise AttemptError("attempt_token is required")
+
+        for question_id, selected in submitted:
+            question = bank.get(question_id)
             
             if question:
                 question_ids.append(question_id)
+                if quiz_level is None:
+                    quiz_level = question["level"]
                 
-                correct_answer_text = get_option_text_by_letter(question, question.correct_option)
+                correct_answers[str(question_id)] = question["answer"]
+                current_level = question["level"]
                 
-                if selected == correct_answer_text:
+                selected_index, selected_option = bank.resolve_answer(question_id, selected)
+                is_correct = bank.is_correct(question_id, selected_index, selected_option)
+                if is_correct:
                     score += 1
-                answers.append((question_id, selected))
-
-        
-        quiz = UserQuiz(user_id=user_id, score=score)
-        db.session.add(quiz)
-        db.session.commit()
+                graded.append((question_id, selected_index, is_correct))
+                answers.append({
+                    "question_id": question_id,
+                    "selected_index": selected_index,
+                    "selected_option": selected_option
+                })
 
         
-        for question_id, selected in answers:
-            ans = UserQuizAnswer(
-                user_quiz_id=quiz.id, 
-                question_id=question_id, 
-                selected_option=selected
+        submitted_at = datetime.utcnow()
+        out_of = graded_out_of(
+            len(question_ids), bank.level_counts.get(quiz_level, 0), len(attempt_ids) if attempt else None
+        )
+        recorded = record_level_attempt(
+            user_id, quiz_level, score, out_of, submitted_at,
+            expected_attempts=attempt["attempt_number"] if attempt else None
+        )
+        if recorded is None:
+            db.session.rollback()
+            raise AttemptError("This attempt has already been submitted", 409)
+        
+        quiz_id = db.session.execute(
+            insert(UserQuiz)
+            .values(
+                user_id=user_id,
+                score=score,
+                submitted_at=submitted_at,
+                level=quiz_level,
+                total_questions=len(question_ids),
+                graded_out_of=out_of
             )
-            db.session.add(ans)
-        db.session.commit()
+            .returning(UserQuiz.id)
+        ).scalar_one()
 
         
-        correct_answers = {}
-        current_level = None
-        for question_id in question_ids:
-            question = Question.query.filter_by(id=question_id).first()
-            if question:
-                correct_answers[str(question_id)] = get_option_text_by_letter(question, question.correct_option)
-                current_level = question.level
+        for answer in answers:
+            answer["user_quiz_id"] = quiz_id
+            answer["submitted_at"] = submitted_at
+        # In write-behind mode the answers are queued once the quiz row has committed.
+        deferred = write_behind_enabled()
+        if not deferred:
+            write_answers(answers, graded)
+        record_leaderboard_attempt(
+            user_id, quiz_level, score, out_of, recorded, submitted_at, len(bank.level_counts)
+        )
+        db.session.commit()
+        if deferred:
+            persist_answers(answers, graded)
+        read_after = write_position()
 
         
-        percentage = (score / len(question_ids)) * 100 if question_ids else 0
+        percentage = level_percentage(score, out_of)
         level_passed = percentage >= 80   
         
         next_level_unlocked = level_passed and current_level < 3
@@ -315,127 +544,207 @@ def submit_quiz():
             "current_level": current_level,
             "next_level_unlocked": next_level_unlocked,
             "is_perfect": score == len(question_ids)
-        }), 200
+        }), 200, {READ_AFTER_HEADER: read_after} if read_after else {}
         
+    except AttemptError as e:
+        return jsonify({"error": e.message}), e.status
     except Exception as e:
         logging.error(f"Error submitting quiz: {str(e)}")
         return jsonify({"error": "Failed to submit quiz"}), 500
 
+def encode_history_cursor(submitted_at, quiz_id):
+    """Build the opaque keyset cursor for the quiz after (submitted_at, quiz_id)"""
+    raw = f"{submitted_at.isoformat()}|{quiz_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_history_cursor(cursor):
+    """Turn a cursor from encode_history_cursor back into (submitted_at, quiz_id)"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    submitted_at, quiz_id = base64.urlsafe_b64decode(padded).decode().split("|")
+    return datetime.fromisoformat(submitted_at), int(quiz_id)
+
+def format_quiz_summary(quiz):
+    total_questions = quiz.total_questions or 0
+    percentage = (quiz.score / total_questions) * 100 if total_questions > 0 else 0
+    
+    return {
+        "quiz_id": quiz.id,
+        "score": quiz.score,
+        "total_questions": total_questions,
+        "percentage": round(percentage, 1),
+        "level": quiz.level or 1,
+        "level_passed": percentage >= 70,
+        "submitted_at": quiz.submitted_at.strftime("%Y-%m-%d %H:%M")
+    }
+
+def parse_history_args():
+    """(paginated, summary_only, limit, cursor) from the /api/quiz-history query string.
+
+    Raises ValueError for a bad limit or cursor.
+    """
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    summary_only = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+    limit = None
+    cursor = None
+    if paginated:
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+        if limit < 1 or limit > HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(limit)
+    if request.args.get('cursor'):
+        cursor = decode_history_cursor(request.args['cursor'])
+    return paginated, summary_only, limit, cursor
+
+def history_statement(user_id, summary_only, limit=None, cursor=None):
+    """SELECT for one history page, joined to its answers unless summary_only.
+
+    Archived quizzes are included, without answers.
+    """
+    quiz = quiz_summaries().c
+    page = select(
+            quiz.id, quiz.score, quiz.submitted_at,
+            quiz.total_questions, quiz.level, quiz.archived)\
+        .where(quiz.user_id == user_id)
+    if cursor:
+        page = page.where(tuple_(quiz.submitted_at, quiz.id) < cursor)
+    page = page.order_by(quiz.submitted_at.desc(), quiz.id.desc())
+    if limit:
+        page = page.limit(limit + 1)
+    if summary_only:
+        return page
+    
+    page = page.subquery('page')
+    return select(
+            page, UserQuizAnswer.question_id,
+            UserQuizAnswer.selected_index, UserQuizAnswer.selected_option)\
+        .outerjoin(UserQuizAnswer, (UserQuizAnswer.user_quiz_id == page.c.id)
+                   & (UserQuizAnswer.submitted_at == page.c.submitted_at))\
+        .order_by(page.c.submitted_at.desc(), page.c.id.desc(), UserQuizAnswer.id)
+
+def history_response(rows, bank, paginated, summary_only, limit=None):
+    """Build the /api/quiz-history response from the rows of history_statement"""
+    if summary_only:
+        quizzes = [(row, None) for row in rows]
+    else:
+        quizzes = []
+        for row in rows:
+            if not quizzes or quizzes[-1][0].id != row.id:
+                quizzes.append((row, []))
+            
+            question = bank.get(row.question_id)
+            if not question:
+                continue
+            
+            quizzes[-1][1].append({
+                "question_id": row.question_id,
+                "question_text": question["question"],
+                "selected_option": bank.answer_text(row.question_id, row.selected_index, row.selected_option),
+                "correct_answer": question["answer"],  
+                "is_correct": bank.is_correct(row.question_id, row.selected_index, row.selected_option),
+                "level": question["level"]
+            })
+    
+    
+    next_cursor = None
+    if limit and len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        last = quizzes[-1][0]
+        next_cursor = encode_history_cursor(last.submitted_at, last.id)
+    
+    quiz_history = []
+    for quiz, answer_details in quizzes:
+        entry = format_quiz_summary(quiz)
+        if answer_details is not None:
+            entry["answers"] = answer_details
+        if quiz.archived:
+            entry["archived"] = True
+        quiz_history.append(entry)
+    
+    if paginated:
+        return jsonify({"quizzes": quiz_history, "next_cursor": next_cursor})
+    return jsonify(quiz_history)
+
 @quiz_bp.route('/quiz-history', methods=['GET'])
 @jwt_required()
+@replica_reads
 def history():
+    """Quiz history, newest first.
+
+    Without `limit`/`cursor` the full history is returned as a list. With
+    them the response is a page: {"quizzes": [...], "next_cursor": ...}.
+    `summary=1` leaves out the per-answer `answers` arrays.
+    """
     try:
-        user_id = get_jwt_identity()
-        quizzes = UserQuiz.query.filter_by(user_id=user_id)\
-            .order_by(UserQuiz.submitted_at.desc())\
-            .all()
-        
-        quiz_history = []
-        for quiz in quizzes:
-            quiz_answers = UserQuizAnswer.query.filter_by(user_quiz_id=quiz.id).all()
-            
-            answer_details = []
-            quiz_level = None
-            
-            for answer in quiz_answers:
-                question = Question.query.filter_by(id=answer.question_id).first()
-                
-                if question:
-                    if quiz_level is None:
-                        quiz_level = question.level
-                    
-                    
-                    correct_answer_text = get_option_text_by_letter(question, question.correct_option)
-                    is_correct = answer.selected_option == correct_answer_text
-                    
-                    answer_details.append({
-                        "question_id": answer.question_id,
-                        "question_text": question.question_text,
-                        "selected_option": answer.selected_option,
-                        "correct_answer": correct_answer_text,  
-                        "is_correct": is_correct,
-                        "level": question.level
-                    })
-            
-           
-            total_questions = len(answer_details)
-            percentage = (quiz.score / total_questions) * 100 if total_questions > 0 else 0
-            
-            quiz_history.append({
-                "quiz_id": quiz.id,
-                "score": quiz.score,
-                "total_questions": total_questions,
-                "percentage": round(percentage, 1),
-                "level": quiz_level or 1,
-                "level_passed": percentage >= 70,
-                "submitted_at": quiz.submitted_at.strftime("%Y-%m-%d %H:%M"),
-                "answers": answer_details
-            })
+        user_id = int(get_jwt_identity())
+        try:
+            paginated, summary_only, limit, cursor = parse_history_args()
+        except ValueError:
+            return jsonify({"message": f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE} and cursor must come from next_cursor"}), 400
         
-        return jsonify(quiz_history)
+        rows = db.session.execute(history_statement(user_id, summary_only, limit, cursor)).all()
+        bank = None if summary_only else get_question_bank()
+        return history_response(rows, bank, paginated, summary_only, limit)
         
     except Exception as e:
         logging.error(f"Error fetching quiz history: {str(e)}")
         return jsonify({"message": "Error fetching quiz history", "error": str(e)}), 500
 
-@quiz_bp.route('/user-progress', methods=['GET'])
-@jwt_required()
-def get_user_progress():
-    try:
-        user_id = int(get_jwt_identity())
+def user_progress_payload(user_id, level_counts, ledger):
+    """The /api/user-progress body for a user's ledger"""
+    progress = {}
+    for level in [1, 2, 3]:
         
+        total_questions = level_counts.get(level, 0)
         
-        progress = {}
-        for level in [1, 2, 3]:
-            
-            total_questions = Question.query.filter_by(level=level).count()
-            
-            if total_questions == 0:
-                progress[f"level_{level}"] = {
-                    "total_questions": 0,
-                    "best_score": 0,
-                    "attempts": 0,
-                    "percentage": 0,
-                    "unlocked": level == 1,
-                    "passed": False
-                }
-                continue
-            
-            
-            level_quizzes = db.session.query(UserQuiz.score)\
-                .join(UserQuizAnswer, UserQuiz.id == UserQuizAnswer.user_quiz_id)\
-                .join(Question, UserQuizAnswer.question_id == Question.id)\
-                .filter(UserQuiz.user_id == user_id)\
-                .filter(Question.level == level)\
-                .group_by(UserQuiz.id)\
-                .all()
-                
-            best_score = max([quiz.score for quiz in level_quizzes]) if level_quizzes else 0
-            attempts = len(level_quizzes)
-            
-            percentage = (best_score / total_questions) * 100 if total_questions > 0 else 0
-            passed = percentage >= 70
-            
-            
-            if level == 1:
-                unlocked = True
-            else:
-                prev_level_passed = progress.get(f"level_{level-1}", {}).get("passed", False)
-                unlocked = prev_level_passed
-            
+        if total_questions == 0:
             progress[f"level_{level}"] = {
-                "total_questions": total_questions,
-                "best_score": best_score,
-                "attempts": attempts,
-                "percentage": round(percentage, 1),
-                "unlocked": unlocked,
-                "passed": passed
+                "total_questions": 0,
+                "best_score": 0,
+                "attempts": 0,
+                "percentage": 0,
+                "unlocked": level == 1,
+                "passed": False
             }
+            continue
         
-        return jsonify({
-            "progress": progress,
-            "current_level": get_user_current_level(user_id)
-        }), 200
+        
+        row = ledger.get(level)
+            
+        best_score = row.best_score if row else 0
+        attempts = row.attempts if row else 0
+        
+        percentage = row.best_percentage if row else 0.0
+        passed = percentage >= 70
+        
+        
+        if level == 1:
+            unlocked = True
+        else:
+            prev_level_passed = progress.get(f"level_{level-1}", {}).get("passed", False)
+            unlocked = prev_level_passed
+        
+        progress[f"level_{level}"] = {
+            "total_questions": total_questions,
+            "best_score": best_score,
+            "attempts": attempts,
+            "percentage": round(percentage, 1),
+            "unlocked": unlocked,
+            "passed": passed
+        }
+    
+    return {
+        "progress": progress,
+        "current_level": get_user_current_level(user_id, level_counts, ledger)
+    }
+
+@quiz_bp.route('/user-progress', methods=['GET'])
+@jwt_required()
+@replica_reads
+def get_user_progress():
+    try:
+        user_id = int(get_jwt_identity())
+        level_counts = get_level_question_counts()
+        ledger = get_user_level_progress(user_id)
+        return jsonify(user_progress_payload(user_id, level_counts, ledger)), 200
         
     except Exception as e:
         logging.error(f"Error fetching user progress: {str(e)}")
@@ -0,0 +1,42 @@
+import logging
+
+from src import answer_writer
+
+
+class FullWriter:
+    def offer(self, answers, graded):
+        return False
+
+
+def answers_of_quiz(quiz_id, count):
+    return [{"user_quiz_id": quiz_id, "question_id": question_id, "selected_index": 0}
+            for question_id in range(1, count + 1)]
+
+
+def test_failed_inline_write_is_dropped_not_raised(app_context, monkeypatch, caplog):
+    def failing_write(answers, graded):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(answer_writer, '_get_writer', FullWriter)
+    monkeypatch.setattr(answer_writer, 'write_answers', failing_write)
+    before = dict(answer_writer.counters)
+
+    with caplog.at_level(logging.ERROR):
+        assert answer_writer.persist_answers(answers_of_quiz(42, 3), [(1, 0, True)]) is False
+
+    assert answer_writer.counters["inline_writes"] == before["inline_writes"] + 1
+    assert answer_writer.counters["dropped_rows"] == before["dropped_rows"] + 3
+    assert "Dropping 3 answers of quiz 42" in caplog.text
+
+
+def test_full_queue_writes_inline(app_context, monkeypatch):
+    written = []
+    monkeypatch.setattr(answer_writer, '_get_writer', FullWriter)
+    monkeypatch.setattr(answer_writer, 'write_answers', lambda answers, graded: written.append(answers))
+    monkeypatch.setattr(answer_writer.db.session, 'commit', lambda: None)
+    before = dict(answer_writer.counters)
+
+    answers = answers_of_quiz(7, 2)
+    assert answer_writer.persist_answers(answers, []) is False
+    assert written == [answers]
+    assert answer_writer.counters["dropped_rows"] == before["dropped_rows"]
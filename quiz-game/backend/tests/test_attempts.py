@@ -0,0 +1,28 @@
+import pytest
+
+from src.attempts import AttemptError, issue_attempt_token, load_attempt_token
+
+
+def test_token_round_trip(app_context):
+    token = issue_attempt_token(7, 2, 15, 3, seed=42, count=5)
+    assert load_attempt_token(token, 7) == {
+        "level": 2, "bank_version": 15, "attempt_number": 3, "seed": 42, "count": 5,
+    }
+
+
+def test_whole_level_token_has_no_seed_or_count(app_context):
+    attempt = load_attempt_token(issue_attempt_token(7, 1, 15, 0), 7)
+    assert attempt["seed"] is None and attempt["count"] is None
+
+
+def test_token_of_another_user_is_rejected(app_context):
+    token = issue_attempt_token(7, 2, 15, 3)
+    with pytest.raises(AttemptError) as error:
+        load_attempt_token(token, 8)
+    assert error.value.status == 400
+
+
+def test_tampered_token_is_rejected(app_context):
+    token = issue_attempt_token(7, 2, 15, 3)
+    with pytest.raises(AttemptError):
+        load_attempt_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"), 7)
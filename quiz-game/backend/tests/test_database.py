@@ -0,0 +1,37 @@
+import pytest
+
+from src.database import pool_sizes
+
+
+def pool_config(**overrides):
+    config = {
+        'DB_POOL_SIZE': None,
+        'DB_MAX_OVERFLOW': 2,
+        'DB_MAX_CONNECTIONS': None,
+        'GUNICORN_THREADS': 4,
+        'WEB_CONCURRENCY': 1,
+    }
+    config.update(overrides)
+    return config
+
+
+def test_pool_defaults_to_one_connection_per_thread():
+    assert pool_sizes(pool_config()) == (4, 2)
+
+
+def test_explicit_pool_size_wins():
+    assert pool_sizes(pool_config(DB_POOL_SIZE=10)) == (10, 2)
+
+
+def test_connection_cap_is_split_between_workers():
+    assert pool_sizes(pool_config(GUNICORN_THREADS=8, WEB_CONCURRENCY=4, DB_MAX_CONNECTIONS=20)) == (5, 0)
+    assert pool_sizes(pool_config(WEB_CONCURRENCY=2, DB_MAX_CONNECTIONS=11)) == (4, 1)
+
+
+def test_connection_cap_below_one_per_worker_is_refused():
+    with pytest.raises(ValueError, match="DB_MAX_CONNECTIONS=3"):
+        pool_sizes(pool_config(WEB_CONCURRENCY=4, DB_MAX_CONNECTIONS=3))
+
+
+def test_connection_cap_of_one_per_worker():
+    assert pool_sizes(pool_config(WEB_CONCURRENCY=4, DB_MAX_CONNECTIONS=4)) == (1, 0)
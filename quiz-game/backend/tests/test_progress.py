@@ -0,0 +1,23 @@
+from src.progress import PASS_PERCENTAGE, graded_out_of, level_percentage
+
+
+def test_attempt_is_graded_out_of_its_signed_questions():
+    out_of = graded_out_of(10, 50, attempt_questions=10)
+    assert out_of == 10
+    assert level_percentage(10, out_of) == 100
+
+
+def test_tokenless_submit_is_graded_out_of_the_level():
+    out_of = graded_out_of(1, 10)
+    assert out_of == 10
+    assert level_percentage(1, out_of) == 10
+    assert level_percentage(1, out_of) < PASS_PERCENTAGE
+
+
+def test_tokenless_submit_longer_than_the_level_counts_its_own_length():
+    assert graded_out_of(12, 10) == 12
+
+
+def test_level_without_questions():
+    assert graded_out_of(0, None) == 0
+    assert level_percentage(0, 0) == 0
@@ -0,0 +1,38 @@
+from collections import namedtuple
+
+from src.question_bank import QuestionBank
+
+Row = namedtuple('Row', 'id question_text option_a option_b option_c option_d correct_option level')
+
+
+def make_bank(per_level=20):
+    rows = [
+        Row(level * 100 + i, f"Q{level}-{i}", "a", "b", "c", "d", "A", level)
+        for level in (1, 2) for i in range(per_level)
+    ]
+    return QuestionBank(1, rows)
+
+
+def test_same_seed_draws_the_same_questions():
+    bank = make_bank()
+    first = bank.attempt_question_ids(1, seed=1234, count=5)
+    assert bank.attempt_question_ids(1, seed=1234, count=5) == first
+    assert make_bank().attempt_question_ids(1, seed=1234, count=5) == first
+
+
+def test_draw_is_sorted_and_from_the_level():
+    bank = make_bank()
+    ids = bank.attempt_question_ids(2, seed=7, count=8)
+    assert len(ids) == 8
+    assert ids == sorted(set(ids))
+    assert set(ids) <= set(bank.level_ids[2])
+
+
+def test_without_count_or_with_too_many_the_whole_level_is_returned():
+    bank = make_bank()
+    assert bank.attempt_question_ids(1) == bank.level_ids[1]
+    assert bank.attempt_question_ids(1, seed=3, count=50) == bank.level_ids[1]
+
+
+def test_unknown_level_has_no_questions():
+    assert make_bank().attempt_question_ids(3, seed=1, count=2) == []
@@ -0,0 +1,9 @@
+def test_answering_a_question_twice_is_rejected(client, auth_headers):
+    # "1" and "01" name the same question.
+    response = client.post('/api/submit', json={"answers": {"1": "a", "01": "b"}}, headers=auth_headers())
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Each question can only be answered once"}
+
+
+def test_submit_requires_a_login(client):
+    assert client.post('/api/submit', json={"answers": {"1": "a"}}).status_code == 401
@@ -29,9 +29,20 @@ export default function App() {
       ...options.headers,
     };
 
+    // Echo the position of our last write so reads after a submit see it.
+    const readAfter = localStorage.getItem("readAfter");
+    if (readAfter) {
+      headers["X-Read-After"] = readAfter;
+    }
+
     try {
       const response = await fetch(url, { ...options, headers });
 
+      const writePosition = response.headers.get("X-Read-After");
+      if (writePosition) {
+        localStorage.setItem("readAfter", writePosition);
+      }
+
       if (response.status === 401) {
         const errorData = await response.json().catch(() => ({}));
 
@@ -8,6 +8,7 @@ const QuizPage = ({ apiCall }) => {
   const [currentLevel, setCurrentLevel] = useState(1);
   const [totalLevels, setTotalLevels] = useState(3);
   const [levelInfo, setLevelInfo] = useState(null);
+  const [attemptToken, setAttemptToken] = useState(null);
   const [index, setIndex] = useState(0);
   const [score, setScore] = useState(0);
   const [selected, setSelected] = useState(null);
@@ -53,6 +54,7 @@ const QuizPage = ({ apiCall }) => {
         setCurrentLevel(data.current_level || 1);
         setTotalLevels(data.total_levels || 3);
         setLevelInfo(data.level_info || null);
+        setAttemptToken(data.attempt_token || null);
         resetState();
       } else {
         setError(data.message || "No questions available for your current level");
@@ -95,7 +97,7 @@ const QuizPage = ({ apiCall }) => {
     try {
       const response = await apiCall("http://localhost:5000/api/submit", {
         method: "POST",
-        body: JSON.stringify({ answers }),
+        body: JSON.stringify({ answers, attempt_token: attemptToken }),
       });
 
       if (!response.ok) {